@@ -1,7 +1,15 @@
 import os
-from flask_migrate import Migrate, upgrade
-from app import create_app, db
-from app.models import User, Role, Permission, ClasificadorTareasABC, Task
+import sys
+import json
+import click
+from sqlalchemy.exc import DBAPIError
+from flask_migrate import Migrate, upgrade, stamp
+from app import create_app, db, outbox
+from app.models import User, Role, Permission, ClasificadorTareasABC, Task, TaskSummary, TaskArchive
+from app.maintenance import backfill_task_dates, rebuild_task_summary, task_summary_missing, rebuild_task_search, \
+    check_task_search, archive_tasks
+from app.assets import build as build_assets
+from app.transfer import FORMATOS, formato_de, export_tasks, import_tasks
 
 # Instanciar/Crear apicación
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
@@ -13,7 +21,7 @@ app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 #ClasificadorTareasABC.insert_clasificador()
 
 # Migración 1
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
 
 @app.shell_context_processor
 def make_shell_context():
@@ -22,16 +30,208 @@ def make_shell_context():
                 Role=Role,
                 Permission=Permission,
                 ClasificadorTareasABC=ClasificadorTareasABC,
-                Task=Task)
+                Task=Task,
+                TaskSummary=TaskSummary,
+                TaskArchive=TaskArchive)
 
 @app.cli.command()
 def deploy():
     """ Arrancar todas las operaciones de desarrollo. """
+    # Bbdd creada con create_all sin revisión de Alembic: si ya tiene el esquema del modelo actual se
+    # registra la última revisión y, si no, el esquema inicial para aplicar después las migraciones
+    if db.alembic_revision() is None and db.engine.has_table('users'):
+        if db.matches_models():
+            stamp(revision='head')
+        else:
+            stamp(revision='6a1f0c3d2b91')
+
     # Migrar la bbdd a la última versión
     upgrade()
 
+    # Normalizar las fechas de las tareas (columnas Date)
+    if db.engine.dialect.name == 'sqlite':
+        for _ in backfill_task_dates():
+            pass
+
+    # Calcular el resumen de tareas si está vacío (tabla recién creada). Después lo mantienen los triggers
+    # y, si hace falta, se recalcula con `flask rebuild-task-summary`
+    if task_summary_missing():
+        for _ in rebuild_task_summary():
+            pass
+
+    # Crear el índice de búsqueda de las tareas si falta (bbdd creadas con create_all antes de tenerlo)
+    if db.engine.dialect.name == 'sqlite' and not db.engine.has_table('task_search'):
+        rebuild_task_search()
+
     # Crear o actualizar roles de usuario
     Role.insert_roles()
 
+    # Crear o actualizar el clasificador de tareas ABC (y recargar sus tipos)
+    ClasificadorTareasABC.insert_clasificador()
+
+    # Empaquetar los ficheros estáticos
+    build_assets(app.static_folder, app.static_url_path)
+
+@app.cli.command('backfill-task-dates')
+@click.option('--batch-size', type=int, default=1000, help='Filas por transacción.')
+@click.option('--desde-id', type=int, default=0, help='Reanudar a partir de este id de tarea.')
+@click.option('--pausa', type=float, default=0.0, help='Segundos de espera entre lotes.')
+def backfill_task_dates_command(batch_size, desde_id, pausa):
+    """ Normalizar por lotes las fechas de las tareas al formato de las columnas Date. """
+    total = 0
+    for ultimo_id, modificadas in backfill_task_dates(batch_size, desde_id, pausa):
+        total += modificadas
+        click.echo('Lote hasta id {}: {} filas modificadas'.format(ultimo_id, modificadas))
+    click.echo('Fechas normalizadas: {} filas modificadas'.format(total))
+
+@app.cli.command('rebuild-task-summary')
+@click.option('--batch-size', type=int, default=500, help='Usuarios por transacción.')
+@click.option('--usuario', type=int, default=None, help='Recalcular solo el resumen de este usuario.')
+def rebuild_task_summary_command(batch_size, usuario):
+    """ Recalcular desde la tabla manager el resumen de tareas por usuario y tipo ABC. """
+    total = 0
+    for ultimo, filas in rebuild_task_summary(batch_size, usuario):
+        total += filas
+        click.echo('Lote hasta usuario {}: {} filas de resumen'.format(ultimo, filas))
+    click.echo('Resumen recalculado: {} filas'.format(total))
+
+@app.cli.command('rebuild-task-search')
+@click.option('--check', is_flag=True, help='Solo comprobar que el índice coincide con las tareas.')
+def rebuild_task_search_command(check):
+    """ Reconstruir desde la tabla manager el índice de búsqueda de texto de las tareas (SQLite FTS5). """
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('El índice de búsqueda solo existe en SQLite; en otros motores se busca con LIKE.', err=True)
+        sys.exit(1)
+    if check:
+        try:
+            check_task_search()
+        except DBAPIError as e:
+            click.echo('Índice de búsqueda incorrecto: {}'.format(e.orig), err=True)
+            sys.exit(1)
+        click.echo('Índice de búsqueda correcto')
+        return
+    click.echo('Índice de búsqueda reconstruido: {} tareas'.format(rebuild_task_search()))
+
+@app.cli.command('archive-tasks')
+@click.option('--dias', type=int, default=None, help='Antigüedad mínima de la fecha final (ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=None, help='Tareas por transacción (ARCHIVE_BATCH_SIZE).')
+@click.option('--desde-id', type=int, default=0, help='Reanudar a partir de este id de tarea.')
+@click.option('--pausa', type=float, default=0.0, help='Segundos de espera entre lotes.')
+def archive_tasks_command(dias, batch_size, desde_id, pausa):
+    """ Mover por lotes las tareas finalizadas antiguas a la tabla manager_archive (para ejecutar con cron). """
+    dias = app.config['ARCHIVE_AFTER_DAYS'] if dias is None else dias
+    total = 0
+    for ultimo_id, archivadas in archive_tasks(dias, batch_size or app.config['ARCHIVE_BATCH_SIZE'], desde_id, pausa):
+        total += archivadas
+        click.echo('Lote hasta id {}: {} tareas archivadas'.format(ultimo_id, archivadas))
+    click.echo('Tareas archivadas: {}'.format(total))
+
+@app.cli.command('export-tasks')
+@click.argument('output', type=click.File('w', encoding='utf-8', lazy=False), default='-')
+@click.option('--format', 'formato', type=click.Choice(FORMATOS), default=None,
+              help='csv o jsonl (por defecto, según la extensión del fichero).')
+@click.option('--usuario', type=int, default=None, help='Exportar solo las tareas de este usuario.')
+@click.option('--batch-size', type=int, default=1000, help='Filas leídas de la bbdd cada vez.')
+def export_tasks_command(output, formato, usuario, batch_size):
+    """ Exportar las tareas a un fichero CSV o JSON Lines (o a la salida estándar). """
+    total = export_tasks(output, formato_de(getattr(output, 'name', None), formato), usuario, batch_size)
+    click.echo('Tareas exportadas: {}'.format(total), err=True)
+
+@app.cli.command('import-tasks')
+@click.argument('input', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'formato', type=click.Choice(FORMATOS), default=None,
+              help='csv o jsonl (por defecto, según la extensión del fichero).')
+@click.option('--usuario', type=int, default=None, help='Asignar todas las tareas a este usuario.')
+@click.option('--batch-size', type=int, default=1000, help='Filas por transacción.')
+def import_tasks_command(input, formato, usuario, batch_size):
+    """ Importar tareas de un fichero CSV o JSON Lines, por lotes de una transacción cada uno. """
+    total = descartadas = 0
+    formato = formato_de(getattr(input, 'name', None), formato)
+    for linea, insertadas, errores in import_tasks(input, formato, batch_size, usuario):
+        total += insertadas
+        descartadas += len(errores)
+        for linea_error, error in errores:
+            click.echo('Línea {}: {}'.format(linea_error, error), err=True)
+        click.echo('Lote hasta la línea {}: {} tareas'.format(linea, insertadas))
+    click.echo('Tareas importadas: {} Descartadas: {}'.format(total, descartadas))
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """ Empaquetar, minimizar y precomprimir los CSS/JS en static/dist (con manifest.json). """
+    manifest = build_assets(app.static_folder, app.static_url_path)
+    for nombre, destino in sorted(manifest.items()):
+        click.echo('{} -> dist/{}'.format(nombre, destino))
+
+@app.cli.command('outbox')
+@click.option('--drain', is_flag=True, help='Enviar ahora los emails pendientes.')
+@click.option('--purge', is_flag=True, help='Borrar los enviados hace más de OUTBOX_RETENTION_DAYS días.')
+def outbox_command(drain, purge):
+    """ Estado de la bandeja de salida de emails (profundidad de la cola, fallidos, latencia). """
+    if drain:
+        enviados, fallidos = outbox.drain()
+        click.echo('Enviados: {} Fallidos: {}'.format(enviados, fallidos))
+    if purge:
+        click.echo('Borrados: {}'.format(outbox.purge()))
+    click.echo(json.dumps(outbox.stats(), indent=2))
+
+@app.cli.command('startup-profile')
+@click.option('--budget', type=int, default=None, help='Presupuesto de arranque en ms (STARTUP_BUDGET_MS).')
+@click.option('--top', type=int, default=15, help='Número de módulos más lentos a mostrar.')
+def startup_profile(budget, top):
+    """ Medir el tiempo de import y de create_app() de un worker en frío. """
+    from app.startup import measure_startup
+
+    report = measure_startup(os.getenv('FLASK_CONFIG') or 'default', top=top)
+    report['budget_ms'] = budget or app.config['STARTUP_BUDGET_MS']
+    click.echo(json.dumps(report, indent=2))
+
+    if report['total_ms'] > report['budget_ms']:
+        click.echo('Arranque por encima del presupuesto: {} ms > {} ms'.format(report['total_ms'],
+                                                                            report['budget_ms']), err=True)
+        sys.exit(1)
+
+@app.cli.command('serve')
+@click.option('--bind', default=None, help='Dirección host:puerto (SERVER_BIND).')
+@click.option('--workers', type=int, default=None, help='Procesos worker (SERVER_WORKERS, 0: 2 por núcleo + 1).')
+@click.option('--threads', type=int, default=None, help='Hilos por worker (SERVER_THREADS).')
+@click.option('--max-requests', type=int, default=None, help='Reciclar cada worker tras N peticiones.')
+def serve(bind, workers, threads, max_requests):
+    """ Arrancar el servidor de producción (gunicorn con la aplicación precargada, ver wsgi.py). """
+    import importlib.util
+    if importlib.util.find_spec('gunicorn') is None:
+        click.echo('gunicorn no está instalado: pip install gunicorn', err=True)
+        sys.exit(1)
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    args = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(root, 'gunicorn.conf.py'), '--chdir', root]
+    for opcion, valor in (('--bind', bind), ('--workers', workers), ('--threads', threads),
+                          ('--max-requests', max_requests)):
+        if valor is not None:
+            args += [opcion, str(valor)]
+    args.append('wsgi:app')
+
+    # El proceso de gunicorn sustituye al de flask
+    os.execv(sys.executable, args)
+
+@app.cli.command('benchmark')
+@click.option('--users', type=int, default=100, help='Usuarios sintéticos.')
+@click.option('--tasks', type=int, default=10000, help='Tareas sintéticas (en total).')
+@click.option('--concurrency', type=int, default=8, help='Usuarios virtuales simultáneos.')
+@click.option('--requests', 'repeticiones', type=int, default=20, help='Recorridos por usuario virtual.')
+@click.option('--batch-size', type=int, default=1000, help='Filas por inserción en la carga de datos.')
+@click.option('--seed', 'semilla', type=int, default=42, help='Semilla de los datos sintéticos.')
+@click.option('--database', default=None, help='URI de una bbdd vacía (por defecto, SQLite temporal).')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Guardar el informe JSON.')
+def benchmark(users, tasks, concurrency, repeticiones, batch_size, semilla, database, output):
+    """ Prueba de carga con datos sintéticos: rendimiento y percentiles de latencia por operación. """
+    from app.benchmark import measure
+
+    report = measure(users, tasks, concurrency, repeticiones, batch_size, semilla, database)
+    informe = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(informe + '\n')
+    click.echo(informe)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5500)
\ No newline at end of file
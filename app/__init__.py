@@ -25,11 +25,35 @@ def create_app(config_name):
     login_manager.init_app(app=app)
     bootstrap.init_app(app=app)
     datepicker.init_app(app=app)
+    assets.init_app(app=app)
+    avatar_cache.init_app(app=app)
+    identity_cache.init_app(app=app)
+    page_cache.init_app(app=app)
+    last_seen_buffer.init_app(app=app)
+    password_hasher.init_app(app=app)
+    outbox.init_app(app=app)
+    telemetry.init_app(app=app)
+    events.init_app(app=app)
+    admission.init_app(app=app)
 
-    # Crear modelo de datos en la bbdd
-    db.Base.metadata.create_all(db.engine)
+    # Engine con pool de conexiones y una sesión por petición
+    db.init_app(app)
 
-    # Registrar planos de la aplicación
+    # Crear modelo de datos en la bbdd (o confiar en la revisión de Alembic)
+    from . import models
+    db.ensure_schema(app)
+
+    # Cargar en memoria los tipos de tarea (clasificador ABC). Si la bbdd aún no está migrada se
+    # cargarán al ejecutar `flask deploy` (insert_clasificador)
+    try:
+        models.ClasificadorTareasABC.load()
+    except db.DBAPIError as e:
+        app.logger.warning('No se ha podido cargar el clasificador de tareas: %s', e)
+    finally:
+        db.session.remove()
+    app.add_template_global(models.ClasificadorTareasABC.tipos, 'tipos_tarea')
+
+    # Registrar planos de la aplicación (las vistas se importan la primera vez que se usan)
     with app.app_context():
         # Plano principal
         from .main import main as main_blueprint
@@ -0,0 +1,109 @@
+"""
+Control de admisión de los endpoints caros por clase (ADMISSION_LIMITS).
+
+Cada clase tiene dos límites, declarados en la vista con @limited('clase') (app/decorators.py):
+
+- Peticiones simultáneas por worker (`concurrency`). Por encima se responde 503 al momento con
+  Retry-After, en lugar de ocupar los hilos del worker que necesitan las páginas baratas (perfil,
+  agenda, estáticos).
+- Token bucket por IP y por usuario (`rate` peticiones por segundo con ráfagas de hasta `burst`). Si
+  se agota se responde 429 con Retry-After (segundos hasta que haya un token).
+
+Los contadores están en memoria de cada proceso: con N workers el límite real es N veces el
+configurado. Detrás de un proxy la IP del cliente se toma de X-Forwarded-For (PROXY_FIX_X_FOR, wsgi.py).
+"""
+
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+from .exceptions import RateLimited, Overloaded
+
+
+class TokenBuckets(object):
+    """ Token buckets por clave, acotados en número (se descartan los menos usados, que están llenos). """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # clave -> (tokens, instante de la última actualización)
+        self._lock = Lock()
+
+    def take(self, claves, rate, burst):
+        """
+        Consume un token de cada clave si todas tienen alguno. Devuelve 0 si lo consigue o, si no, los
+        segundos que faltan para tenerlo.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            estados = []
+            for clave in claves:
+                tokens, instante = self._buckets.get(clave, (burst, ahora))
+                estados.append(min(burst, tokens + (ahora - instante) * rate))
+            falta = max(1 - tokens for tokens in estados)
+            if falta > 0:
+                return falta / rate if rate else float('inf')
+
+            for clave, tokens in zip(claves, estados):
+                self._buckets[clave] = (tokens - 1, ahora)
+                self._buckets.move_to_end(clave)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class AdmissionControl(object):
+
+    def __init__(self):
+        self.enabled = True
+        self.limits = {}
+        self.retry_after = 1
+        self.buckets = TokenBuckets()
+        self._in_flight = {}  # clase -> peticiones en curso en este proceso
+        self._rejected = {}   # (clase, motivo) -> peticiones rechazadas en este proceso
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_CONTROL', self.enabled)
+        self.limits = app.config.get('ADMISSION_LIMITS', self.limits)
+        self.retry_after = app.config.get('ADMISSION_RETRY_AFTER', self.retry_after)
+        self.buckets = TokenBuckets(app.config.get('ADMISSION_BUCKETS_MAX', self.buckets.maxsize))
+        with self._lock:
+            self._in_flight.clear()
+            self._rejected.clear()
+
+    def _rechazar(self, clase, motivo, excepcion, retry_after):
+        with self._lock:
+            self._rejected[clase, motivo] = self._rejected.get((clase, motivo), 0) + 1
+        raise excepcion(retry_after=max(1, math.ceil(retry_after)))
+
+    def acquire(self, clase, claves):
+        """
+        Admite una petición de la clase para las claves de cliente (IP, usuario) o lanza RateLimited (429)
+        u Overloaded (503). Si se admite, hay que llamar después a release(clase).
+        """
+        limite = self.limits.get(clase, {})
+        if limite.get('rate'):
+            espera = self.buckets.take([(clase,) + clave for clave in claves], limite['rate'], limite['burst'])
+            if espera:
+                self._rechazar(clase, 'rate', RateLimited, espera)
+
+        with self._lock:
+            en_curso = self._in_flight.get(clase, 0)
+            lleno = limite.get('concurrency') and en_curso >= limite['concurrency']
+            if not lleno:
+                self._in_flight[clase] = en_curso + 1
+        if lleno:
+            self._rechazar(clase, 'concurrency', Overloaded, self.retry_after)
+
+    def release(self, clase):
+        with self._lock:
+            self._in_flight[clase] = self._in_flight.get(clase, 1) - 1
+
+    def stats(self):
+        """ Peticiones en curso por clase y rechazadas por (clase, motivo) en este proceso. """
+        with self._lock:
+            return {'in_flight': dict(self._in_flight), 'rejected': dict(self._rejected)}
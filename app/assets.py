@@ -0,0 +1,215 @@
+"""
+Ficheros estáticos de la aplicación: empaquetado, huella de contenido y precompresión.
+
+`flask build-assets` (también lo ejecuta `flask deploy`) une y minimiza los CSS/JS de fays según
+BUNDLES y escribe en static/dist un fichero por paquete con el hash de su contenido en el nombre
+(base.3f2a1b9c.css), sus variantes .gz y .br (esta última solo si está instalado el paquete brotli) y
+un manifest.json con la correspondencia entre nombres.
+
+En las plantillas se usa asset_url('base.css'): devuelve la URL /assets/<nombre con hash>, que se
+sirve con la variante comprimida que admita el navegador y Cache-Control inmutable de un año. Un cambio
+en el contenido cambia el nombre, de modo que el navegador nunca usa una versión antigua.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+from flask import abort, request, safe_join, send_file, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Paquetes: nombre -> ficheros de static que lo forman, en orden
+BUNDLES = {
+    'base.css': ('fays-0.0.1/css/bootstrap-cdn-litera.min.css', 'fays-0.0.1/css/base.css'),
+    'home.css': ('fays-0.0.1/css/home.css',),
+    'login.css': ('fays-0.0.1/css/login.css',),
+    'register.css': ('fays-0.0.1/css/register.css',),
+    'unconfirmed.css': ('fays-0.0.1/css/unconfirmed.css',),
+    'edit_profile.css': ('fays-0.0.1/css/edit_profile.css',),
+    'manager.css': ('fays-0.0.1/css/manager.css',),
+    'agenda.css': ('fays-0.0.1/css/agenda.css',),
+    'home.js': ('fays-0.0.1/js/home.js',),
+    'manager.js': ('fays-0.0.1/js/manager.js',),
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+# Ficheros de una compilación: <paquete>.<hash>.<ext> y sus variantes .gz y .br
+_COMPILADO = re.compile(r'^(?P<fichero>.+\.[0-9a-f]{12}\.[^.]+?)(\.gz|\.br)?$')
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)(?!data:|https?:|/)([^'")]+)\1\s*\)''')
+_CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+
+
+def minify_css(css):
+    """ Quita comentarios (salvo /*! ... */ de licencias) y espacios innecesarios. """
+    css = _CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """
+    Minimización conservadora: quita sangría, líneas vacías y líneas que solo tienen un comentario //.
+    No reescribe el código, de modo que no puede cambiar su significado.
+    """
+    lineas = (linea.strip() for linea in js.splitlines())
+    return '\n'.join(linea for linea in lineas if linea and not linea.startswith('//'))
+
+
+def _rebase_urls(css, fuente, static_url_path):
+    """ Convierte las url() relativas al fichero fuente en rutas absolutas bajo /static. """
+    carpeta = os.path.dirname(fuente)
+
+    def absoluta(match):
+        ruta = os.path.normpath(os.path.join(carpeta, match.group(2))).replace(os.sep, '/')
+        return "url('{}/{}')".format(static_url_path, ruta)
+
+    return _CSS_URL.sub(absoluta, css)
+
+
+def build_bundle(static_folder, static_url_path, nombre, fuentes):
+    """ Contenido (bytes) del paquete `nombre`: fuentes unidas y minimizadas. """
+    partes = []
+    for fuente in fuentes:
+        with open(os.path.join(static_folder, fuente), encoding='utf-8') as f:
+            contenido = f.read()
+        if nombre.endswith('.css'):
+            contenido = _rebase_urls(contenido, fuente, static_url_path)
+            # Los .min ya vienen minimizados (y con sus comentarios de licencia)
+            partes.append(contenido if '.min.' in fuente else minify_css(contenido))
+        else:
+            partes.append(contenido if '.min.' in fuente else minify_js(contenido))
+    separador = '\n' if nombre.endswith('.css') else ';\n'
+    return separador.join(partes).encode('utf-8')
+
+
+def build(static_folder, static_url_path='/static', bundles=None):
+    """
+    Escribe los paquetes con hash, sus variantes comprimidas y el manifest en static/dist. Borra los
+    paquetes de compilaciones anteriores salvo los de la inmediatamente anterior, que pueden estar
+    sirviendo todavía los workers que no se han reiniciado. Devuelve el manifest.
+    """
+    bundles = BUNDLES if bundles is None else bundles
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    try:
+        with open(os.path.join(dist, MANIFEST), encoding='utf-8') as f:
+            anterior = json.load(f)
+    except (OSError, ValueError):
+        anterior = {}
+
+    manifest = {}
+    for nombre, fuentes in sorted(bundles.items()):
+        contenido = build_bundle(static_folder, static_url_path, nombre, fuentes)
+        base, extension = os.path.splitext(nombre)
+        destino = '{}.{}{}'.format(base, hashlib.sha256(contenido).hexdigest()[:12], extension)
+        manifest[nombre] = destino
+
+        ruta = os.path.join(dist, destino)
+        _write(ruta, contenido)
+        # mtime=0: el .gz no cambia si no cambia el contenido
+        _write(ruta + '.gz', gzip.compress(contenido, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(ruta + '.br', brotli.compress(contenido))
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    # Limpiar compilaciones anteriores. Solo se borran paquetes con hash: ni los temporales de otra
+    # compilación en curso ni ficheros ajenos.
+    vigentes = set(manifest.values()) | set(anterior.values())
+    for fichero in os.listdir(dist):
+        compilado = _COMPILADO.match(fichero)
+        if compilado and compilado.group('fichero') not in vigentes:
+            try:
+                os.remove(os.path.join(dist, fichero))
+            except FileNotFoundError:
+                pass
+    return manifest
+
+
+def _write(ruta, contenido):
+    """
+    Escritura atómica: los workers que sirven el fichero nunca ven uno a medio escribir. El temporal tiene
+    un nombre único, de modo que dos compilaciones a la vez no escriben en el mismo.
+    """
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contenido)
+        os.chmod(temporal, 0o644)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.remove(temporal)
+        raise
+
+
+class Assets(object):
+
+    def __init__(self, max_age=31536000):
+        self.max_age = max_age
+        self.auto_build = False
+        self.manifest = {}
+        self.dist = None
+
+    def init_app(self, app):
+        self.max_age = app.config.get('ASSETS_MAX_AGE', self.max_age)
+        self.auto_build = app.config.get('ASSETS_AUTO_BUILD', self.auto_build)
+        self.dist = os.path.join(app.static_folder, DIST)
+        self.manifest = self._load(app)
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.send_asset)
+        app.add_template_global(self.asset_url)
+
+    def _load(self, app):
+        """
+        Lee el manifest de static/dist. Si no existe (o está incompleto), o con ASSETS_AUTO_BUILD para ver
+        los cambios de las fuentes al reiniciar, compila los paquetes.
+        """
+        try:
+            if self.auto_build:
+                raise OSError
+            with open(os.path.join(self.dist, MANIFEST), encoding='utf-8') as f:
+                manifest = json.load(f)
+            if set(BUNDLES) <= set(manifest):
+                return manifest
+        except (OSError, ValueError):
+            pass
+        logger.info('Compilando ficheros estáticos en %s', self.dist)
+        return build(app.static_folder, app.static_url_path)
+
+    def asset_url(self, nombre):
+        """ URL del paquete `nombre` (p. ej. 'base.css') con la huella de su contenido. """
+        return url_for('assets', filename=self.manifest[nombre])
+
+    def send_asset(self, filename):
+        """ Sirve un fichero de static/dist con la variante precomprimida que acepte el navegador. """
+        ruta = safe_join(self.dist, filename)
+        if filename == MANIFEST or not os.path.isfile(ruta):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        codificacion = None
+        for candidata, extension in (('br', '.br'), ('gzip', '.gz')):
+            if candidata in request.accept_encodings and os.path.isfile(ruta + extension):
+                ruta, codificacion = ruta + extension, candidata
+                break
+
+        response = send_file(ruta, mimetype=mimetype, conditional=True, cache_timeout=self.max_age)
+        if codificacion:
+            response.headers['Content-Encoding'] = codificacion
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(self.max_age)
+        return response
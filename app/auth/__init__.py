@@ -1,7 +1,18 @@
 from flask import Blueprint
+from ..lazy import lazy_route, lazy_view
 
 # Crear plano de autorización de la aplicación
 auth = Blueprint('auth',__name__)
 
-# Importar vistas del plano
-from . import views
\ No newline at end of file
+# Rutas del plano. Las vistas (views.py) se importan la primera vez que se usan.
+lazy_route(auth, '/register', 'register', methods=['GET', 'POST'])
+lazy_route(auth, '/confirm/<token>', 'confirm')
+lazy_route(auth, '/confirm', 'resend_confirmation')
+lazy_route(auth, '/unconfirmed', 'unconfirmed')
+lazy_route(auth, '/login', 'login', methods=['GET', 'POST'])
+lazy_route(auth, '/logout', 'logout')
+lazy_route(auth, '/change-password', 'change_password', methods=['GET', 'POST'])
+lazy_route(auth, '/reset', 'password_reset_request', methods=['GET', 'POST'])
+lazy_route(auth, '/reset/<token>', 'password_reset', methods=['GET', 'POST'])
+
+auth.before_app_request(lazy_view(auth, 'before_request'))
\ No newline at end of file
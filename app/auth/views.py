@@ -1,14 +1,14 @@
 from flask import render_template, redirect, request, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from . import auth
 from ..models import User
 from ..email import send_email
-from .. import db
+from .. import db, identity_cache
+from ..decorators import limited
 from .forms import LoginForm, RegistrationForm, ChangePasswordForm, \
     PasswordResetRequestForm, PasswordResetForm, ChangeEmailForm
 
 # Registrarse un usuario
-@auth.route('/register', methods=['GET', 'POST'])
+@limited('auth', methods=('POST',))
 def register():
     # Get data from form
     form = RegistrationForm()
@@ -24,21 +24,21 @@ def register():
 
     return render_template('auth/register.html', form=form) # Register failed to register again
 
-@auth.route('/confirm/<token>')
 @login_required
 def confirm(token):
     if current_user.confirmed:
         return redirect(url_for('main.index'))
     if current_user.confirm(token):
         db.session.commit()
+        identity_cache.invalidate(current_user.id)
         flash('You have confirmed your account. Thanks!')
     else:
         flash('The confirmation link is invalid or has expired')
 
     return redirect(url_for('main.home'))
 
-@auth.route('/confirm')
 @login_required
+@limited('auth')
 def resend_confirmation():
     token = current_user.generate_confirmation_token()
     send_email(['<{}>'.format(current_user.email)], 'Confirm Your Account', 'auth/email/confirm_user', user=current_user, token=token)
@@ -47,7 +47,6 @@ def resend_confirmation():
 # Registrarse un usuario
 
 # Login usuario
-@auth.before_app_request
 def before_request():
     if current_user.is_authenticated:
         current_user.ping()
@@ -56,18 +55,22 @@ def before_request():
 
             return redirect(url_for('auth.unconfirmed'))
 
-@auth.route('/unconfirmed')
 def unconfirmed():
     if current_user.is_anonymous or current_user.confirmed:
         return redirect(url_for('main.index'))
     return render_template('auth/unconfirmed.html')
 
-@auth.route('/login', methods=['GET', 'POST'])
+@limited('auth', methods=('POST',))
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = db.session.query(User).filter_by(email=form.email.data.lower()).first()
         if user is not None and user.verify_password(form.password.data):
+            # Regenerar el hash si han cambiado los parámetros de coste
+            if user.password_needs_rehash():
+                user.password = form.password.data
+                db.session.commit()
+                identity_cache.invalidate(user.id)
             login_user(user, form.remember_me.data)
             next = request.args.get('next')
             if next is None or not next.startswith('/'):
@@ -76,7 +79,6 @@ def login():
         flash('Invalid email or password.')
     return render_template('auth/login.html', form=form)
 
-@auth.route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -85,8 +87,8 @@ def logout():
 # Login usuario
 
 # Cambiar datos usuario
-@auth.route('/change-password', methods=['GET', 'POST'])
 @login_required
+@limited('auth', methods=('POST',))
 def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
@@ -94,13 +96,14 @@ def change_password():
             current_user.password = form.password.data
             db.session.add(current_user)
             db.session.commit()
+            identity_cache.invalidate(current_user.id)
             flash('Your password has been updated')
             return redirect(url_for('main.index'))
         else:
             flash('Invalid password!')
     return render_template('/auth/change_password.html', form=form)
 
-@auth.route('/reset', methods=['GET', 'POST'])
+@limited('auth', methods=('POST',))
 def password_reset_request():
     if not current_user.is_anonymous:
         return redirect(url_for('main.index'))
@@ -116,7 +119,7 @@ def password_reset_request():
             return redirect(url_for('auth.login'))
         return render_template('auth/reset_password.html', form=form)
 
-@auth.route('/reset/<token>', methods=['GET','POST'])
+@limited('auth', methods=('POST',))
 def password_reset(token):
     if not current_user.is_anonymous:
         return redirect(url_for('main.index'))
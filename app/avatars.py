@@ -0,0 +1,139 @@
+"""
+Avatares generados localmente (identicons) con caché en disco.
+
+identicon() dibuja a partir de avatar_hash (md5 del email) una cuadrícula simétrica de 5x5 con un color
+derivado del hash, y la codifica como PNG sin dependencias externas. El mismo hash y tamaño dan
+siempre la misma imagen, de modo que la URL /avatar/<hash>/<tamaño>.png se sirve como inmutable.
+
+AvatarCache guarda en AVATAR_CACHE_DIR los PNG ya generados y, cuando ocupan más de
+AVATAR_CACHE_MAX_BYTES, borra los menos usados según la fecha de acceso, que se actualiza en cada
+acierto (la de modificación no cambia: de ella dependen el ETag y Last-Modified de la respuesta).
+"""
+
+import colorsys
+import logging
+import os
+import struct
+import tempfile
+import time
+import zlib
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+CELDAS = 5
+FONDO = (240, 240, 240)
+
+
+def _chunk(tipo, datos):
+    return struct.pack('>I', len(datos)) + tipo + datos + struct.pack('>I', zlib.crc32(tipo + datos) & 0xffffffff)
+
+
+def png(ancho, alto, filas):
+    """ Codifica como PNG RGB de 8 bits las `filas` (bytes de ancho*3 cada una). """
+    datos = b''.join(b'\x00' + fila for fila in filas)
+    return (b'\x89PNG\r\n\x1a\n'
+            + _chunk(b'IHDR', struct.pack('>IIBBBBB', ancho, alto, 8, 2, 0, 0, 0))
+            + _chunk(b'IDAT', zlib.compress(datos, 9))
+            + _chunk(b'IEND', b''))
+
+
+def identicon(hash, size):
+    """ PNG de size x size píxeles con el identicon de `hash` (cadena hexadecimal de 32 caracteres). """
+    tono = int(hash[-7:], 16) / float(0xfffffff)
+    color = tuple(int(c * 255) for c in colorsys.hls_to_rgb(tono, 0.5, 0.6))
+
+    # Columnas 0-2 del hash, reflejadas en las columnas 3-4
+    cuadricula = []
+    for fila in range(CELDAS):
+        mitad = [int(hash[fila * 3 + columna], 16) % 2 == 0 for columna in range(3)]
+        cuadricula.append(mitad + mitad[1::-1])
+
+    celda = max(1, size // (CELDAS + 1))
+    margen = (size - celda * CELDAS) // 2
+    fondo, tinta = bytes(FONDO), bytes(color)
+
+    filas_cuadricula = []
+    for fila in cuadricula:
+        pixeles = fondo * margen + b''.join((tinta if activa else fondo) * celda for activa in fila)
+        filas_cuadricula.append(pixeles + fondo * (size - margen - celda * CELDAS))
+    vacia = fondo * size
+
+    filas = []
+    for y in range(size):
+        fila = (y - margen) // celda if y >= margen else -1
+        filas.append(filas_cuadricula[fila] if 0 <= fila < CELDAS else vacia)
+    return png(size, size, filas)
+
+
+class AvatarCache(object):
+
+    def __init__(self, directory=None, max_bytes=20 * 1024 * 1024, min_size=8, max_size=512):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_size = min_size
+        self.max_size = max_size
+        self._bytes = None  # Ocupación del directorio (se calcula la primera vez que se usa)
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.directory = app.config.get('AVATAR_CACHE_DIR') or \
+            os.path.join(tempfile.gettempdir(), 'fayspy-avatars')
+        self.max_bytes = app.config.get('AVATAR_CACHE_MAX_BYTES', self.max_bytes)
+        self.min_size = app.config.get('AVATAR_MIN_SIZE', self.min_size)
+        self.max_size = app.config.get('AVATAR_MAX_SIZE', self.max_size)
+        self._bytes = None
+
+    def path(self, hash, size):
+        """ Ruta del PNG de `hash` y `size` en la caché, generándolo si no existe. """
+        ruta = os.path.join(self.directory, '{}-{}.png'.format(hash, size))
+        try:
+            # Acierto: marcar como usado recientemente
+            os.utime(ruta, (time.time(), os.stat(ruta).st_mtime))
+            return ruta
+        except FileNotFoundError:
+            pass
+
+        contenido = identicon(hash, size)
+        os.makedirs(self.directory, exist_ok=True)
+        temporal = '{}.{}.tmp'.format(ruta, os.getpid())
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._usage()
+            else:
+                self._bytes += len(contenido)
+            if self._bytes > self.max_bytes:
+                self._evict(conservar=ruta)
+        return ruta
+
+    def _ficheros(self):
+        for entrada in os.scandir(self.directory):
+            if entrada.name.endswith('.png'):
+                try:
+                    yield entrada.path, entrada.stat()
+                except FileNotFoundError:
+                    continue
+
+    def _usage(self):
+        return sum(stat.st_size for _, stat in self._ficheros())
+
+    def _evict(self, conservar):
+        """ Borra los PNG menos usados hasta bajar del 80 % de max_bytes. """
+        ficheros = sorted(self._ficheros(), key=lambda fichero: fichero[1].st_atime)
+        self._bytes = sum(stat.st_size for _, stat in ficheros)
+        objetivo = self.max_bytes * 0.8
+        for ruta, stat in ficheros:
+            if self._bytes <= objetivo:
+                break
+            if ruta == conservar:
+                continue
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            self._bytes -= stat.st_size
+        logger.info('Caché de avatares reducida a %d bytes', self._bytes)
@@ -0,0 +1,293 @@
+"""
+Prueba de carga reproducible con un conjunto de datos sintético.
+
+`flask benchmark` crea en un proceso Python nuevo (con la configuración 'testing' y una bbdd SQLite en
+un fichero temporal) `usuarios` usuarios y `tareas` tareas mediante inserciones por lotes, y después
+lanza `concurrencia` usuarios virtuales, cada uno con su propio cliente de pruebas, que repiten
+`repeticiones` veces el recorrido típico de la aplicación:
+
+    crear tarea (notebook) -> agenda -> actualizar tarea -> perfil
+
+El login de cada usuario virtual también se mide. El resultado es un JSON con el commit, los parámetros,
+el tiempo de carga de datos y, por operación, el rendimiento (peticiones/s) y los percentiles p50, p95 y
+p99 de latencia en milisegundos, de modo que los informes de dos commits se pueden comparar.
+
+Los datos dependen solo de `semilla`. Los clientes son hilos dentro del mismo proceso que la aplicación:
+las cifras son comparables entre commits, no equivalentes a las de un servidor real.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from threading import Barrier
+
+PASSWORD = 'benchmark'
+
+# Fecha base fija: las fechas de las tareas no dependen del día en que se ejecuta
+FECHA_BASE = date(2024, 1, 1)
+
+OPERACIONES = ('login', 'notebook', 'agenda', 'agenda_update', 'profile')
+
+# Script que se ejecuta en el proceso hijo: imprime el informe en JSON en la última línea de stdout
+_PROBE = """
+import json
+from app.benchmark import run
+print(json.dumps(run(**{params!r})))
+"""
+
+
+def _tareas(rng, usuarios_ids, tareas, tipos):
+    """ Genera las filas de las tareas sintéticas repartidas entre `usuarios_ids`. """
+    for i in range(tareas):
+        inicio = FECHA_BASE + timedelta(days=rng.randrange(365))
+        duracion = round(rng.uniform(0.5, 40), 1)
+        finalizada = rng.random() < 0.3
+        yield {'usuario': usuarios_ids[i % len(usuarios_ids)],
+               'tarea': 'Tarea {}'.format(i),
+               'tipo': rng.choice(tipos),
+               'tiempo_empleado': duracion if finalizada else round(rng.uniform(0, duracion), 1),
+               'duracion_total': duracion,
+               'finalizada': finalizada,
+               'fecha_inicio': inicio,
+               'fecha_final': inicio + timedelta(days=rng.randrange(1, 60))}
+
+
+def _lotes(filas, batch_size):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= batch_size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def seed(usuarios, tareas, batch_size=1000, semilla=42):
+    """
+    Carga los roles, el clasificador y `usuarios` usuarios (bench0@example.com, bench1@example.com...,
+    todos con la contraseña PASSWORD) con `tareas` tareas en total. Las filas se insertan con
+    executemany por lotes de `batch_size`, cada lote en su propia transacción.
+
+    Devuelve {email: (id, username)} de los usuarios creados y los tiempos de la carga.
+    """
+    from sqlalchemy import select
+    from . import db
+    from .extensions import password_hasher
+    from .models import User, Role, Task, ClasificadorTareasABC
+
+    rng = random.Random(semilla)
+    inicio = time.perf_counter()
+
+    Role.insert_roles()
+    ClasificadorTareasABC.insert_clasificador()
+    role_id = db.session.query(Role.id).filter_by(default=True).scalar()
+    db.session.remove()
+
+    # Un único hash: con el coste de producción calcular uno por usuario dominaría la carga
+    password_hash = password_hasher.hash(PASSWORD)
+    ahora = FECHA_BASE
+    filas_usuarios = ({'email': 'bench{}@example.com'.format(i),
+                       'username': 'bench{}'.format(i),
+                       'role_id': role_id,
+                       'password_hash': password_hash,
+                       'confirmed': True,
+                       'name': '',
+                       'member_since': ahora,
+                       'last_seen': ahora,
+                       'avatar_hash': hashlib.md5('bench{}@example.com'.format(i).encode('utf-8')).hexdigest(),
+                       'data_version': 0}
+                      for i in range(usuarios))
+    for lote in _lotes(filas_usuarios, batch_size):
+        with db.engine.begin() as connection:
+            connection.execute(User.__table__.insert(), lote)
+
+    with db.engine.connect() as connection:
+        creados = {email: (id, username) for id, email, username in connection.execute(
+            select([User.id, User.email, User.username]).where(User.email.like('bench%@example.com')))}
+    fin_usuarios = time.perf_counter()
+
+    ids = sorted(id for id, _ in creados.values())
+    tipos = sorted(ClasificadorTareasABC.tipos())
+    for lote in _lotes(_tareas(rng, ids, tareas, tipos), batch_size):
+        with db.engine.begin() as connection:
+            connection.execute(Task.__table__.insert(), lote)
+    fin = time.perf_counter()
+
+    return creados, {'users': usuarios,
+                     'tasks': tareas,
+                     'batch_size': batch_size,
+                     'users_seconds': round(fin_usuarios - inicio, 3),
+                     'tasks_seconds': round(fin - fin_usuarios, 3),
+                     'tasks_per_second': round(tareas / (fin - fin_usuarios), 1) if tareas else 0}
+
+
+def percentil(valores, p):
+    """ Percentil `p` (0-100) por rango más cercano de una lista ordenada. """
+    if not valores:
+        return 0
+    indice = max(0, min(len(valores) - 1, int(round(p / 100.0 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+def _resumen(latencias, errores, segundos):
+    latencias = sorted(latencias)
+    return {'count': len(latencias),
+            'errors': errores,
+            'throughput': round(len(latencias) / segundos, 1) if segundos else 0,
+            'mean_ms': round(sum(latencias) / len(latencias) * 1000, 2) if latencias else 0,
+            'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+            'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+            'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+            'max_ms': round(latencias[-1] * 1000, 2) if latencias else 0}
+
+
+class VirtualUser(object):
+    """ Un cliente de pruebas con su propia sesión que recorre la aplicación como un usuario. """
+
+    def __init__(self, app, email, username, tareas, tipos, semilla):
+        self.client = app.test_client()
+        self.email = email
+        self.username = username
+        self.tareas = tareas
+        self.rng = random.Random(semilla)
+        self.tipos = tipos
+        self.latencias = {operacion: [] for operacion in OPERACIONES}
+        self.errores = dict.fromkeys(OPERACIONES, 0)
+
+    def _medir(self, operacion, metodo, url, esperado=None, **kwargs):
+        """ Mide una petición; es un error si falla o si no devuelve el código `esperado` (o uno < 400). """
+        inicio = time.perf_counter()
+        try:
+            response = metodo(url, **kwargs)
+            correcta = response.status_code == esperado if esperado else response.status_code < 400
+        except Exception:
+            correcta = False
+        duracion = time.perf_counter() - inicio
+        if correcta:
+            self.latencias[operacion].append(duracion)
+        else:
+            self.errores[operacion] += 1
+
+    def login(self):
+        # Los formularios correctos redirigen; con 200 se vuelve a mostrar el formulario con errores
+        self._medir('login', self.client.post, '/auth/login', esperado=302,
+                    data={'email': self.email, 'password': PASSWORD})
+
+    def recorrido(self, i):
+        inicio = FECHA_BASE + timedelta(days=self.rng.randrange(365))
+        self._medir('notebook', self.client.post, '/manager_app/notebook', esperado=302,
+                    data={'tarea': 'Benchmark {}'.format(i),
+                          'tipo': self.rng.choice(self.tipos),
+                          'duracion_total': round(self.rng.uniform(0.5, 40), 1),
+                          'fecha_inicio': inicio.isoformat(),
+                          'fecha_final': (inicio + timedelta(days=7)).isoformat()})
+        self._medir('agenda', self.client.get, '/manager_app/agenda')
+        if self.tareas:
+            datos = {'tiempo_empleado': round(self.rng.uniform(0, 10), 1)}
+            if self.rng.random() < 0.5:
+                datos['finalizada'] = 'y'
+            self._medir('agenda_update', self.client.post,
+                        '/manager_app/agenda/update/id={}'.format(self.rng.choice(self.tareas)), data=datos)
+        self._medir('profile', self.client.get, '/user/{}'.format(self.username))
+
+
+def run(usuarios=100, tareas=10000, concurrencia=8, repeticiones=20, batch_size=1000, semilla=42):
+    """
+    Ejecuta la prueba en este proceso y devuelve el informe. Usa la bbdd de TEST_DATABASE_URL, que
+    debe estar vacía (measure() la crea en un fichero temporal).
+    """
+    from sqlalchemy import select
+    from . import create_app, db
+    from .models import Task, ClasificadorTareasABC
+
+    app = create_app('testing')
+    with app.app_context():
+        creados, carga = seed(usuarios, tareas, batch_size, semilla)
+
+        # Tareas de cada usuario (preparación: no se mide)
+        tareas_por_usuario = {}
+        with db.engine.connect() as connection:
+            for id, usuario in connection.execute(select([Task.id, Task.usuario])):
+                tareas_por_usuario.setdefault(usuario, []).append(id)
+
+    tipos = sorted(ClasificadorTareasABC.tipos())
+    emails = sorted(creados, key=lambda email: creados[email][0])
+    virtuales = []
+    for v in range(concurrencia):
+        email = emails[v % len(emails)]
+        id, username = creados[email]
+        virtuales.append(VirtualUser(app, email, username, tareas_por_usuario.get(id, []), tipos,
+                                     semilla + v))
+
+    barrera = Barrier(concurrencia)
+
+    def ejecutar(virtual):
+        virtual.login()
+        barrera.wait()
+        for i in range(repeticiones):
+            virtual.recorrido(i)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        list(executor.map(ejecutar, virtuales))
+    segundos = time.perf_counter() - inicio
+
+    operaciones = {}
+    todas, errores = [], 0
+    for operacion in OPERACIONES:
+        latencias = [latencia for virtual in virtuales for latencia in virtual.latencias[operacion]]
+        fallidas = sum(virtual.errores[operacion] for virtual in virtuales)
+        operaciones[operacion] = _resumen(latencias, fallidas, segundos)
+        todas += latencias
+        errores += fallidas
+
+    return {'seed': carga,
+            'duration_seconds': round(segundos, 3),
+            'operations': operaciones,
+            'total': _resumen(todas, errores, segundos)}
+
+
+def _commit(root):
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(usuarios=100, tareas=10000, concurrencia=8, repeticiones=20, batch_size=1000, semilla=42,
+            database=None):
+    """
+    Ejecuta run() en un proceso Python nuevo sobre la bbdd `database` (por defecto, una bbdd SQLite en
+    un fichero temporal que se borra al terminar) y devuelve el informe con el commit y las versiones.
+    """
+    import sqlalchemy
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    params = {'usuarios': usuarios, 'tareas': tareas, 'concurrencia': concurrencia,
+              'repeticiones': repeticiones, 'batch_size': batch_size, 'semilla': semilla}
+
+    with tempfile.TemporaryDirectory(prefix='fayspy-benchmark-') as carpeta:
+        uri = database or 'sqlite:///' + os.path.join(carpeta, 'benchmark.db')
+        env = dict(os.environ, TEST_DATABASE_URL=uri,
+                   PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        env.pop('TEST_READ_DATABASE_URL', None)
+        result = subprocess.run([sys.executable, '-c', _PROBE.format(params=params)],
+                                cwd=root, env=env, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+
+    report = {'commit': _commit(root),
+              'python': platform.python_version(),
+              'sqlalchemy': sqlalchemy.__version__,
+              'database': 'sqlite (temporal)' if database is None else database.split('://')[0],
+              'params': params}
+    report.update(json.loads(result.stdout.strip().splitlines()[-1]))
+    return report
@@ -0,0 +1,150 @@
+"""
+Cachés en memoria del proceso.
+
+TTLCache es una caché LRU acotada en tamaño cuyas entradas caducan tras `ttl` segundos. Es segura
+entre hilos y lleva la cuenta de aciertos y fallos. Cada worker tiene su propia copia, de modo que
+el TTL acota el tiempo que una entrada puede quedar desactualizada respecto a otros procesos.
+
+PageCache guarda páginas renderizadas con una clave que incluye la versión de los datos que muestran
+(ver User.touch_data): al cambiar los datos cambia la clave, de modo que las entradas antiguas dejan de
+usarse sin tener que borrarlas. Responde con ETag y Last-Modified (304 si el navegador ya tiene esa
+versión) y agrupa los fallos simultáneos de una misma clave en un único renderizado.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Event, Lock
+from flask import current_app, request, session
+from flask_login import current_user
+
+
+class TTLCache(object):
+
+    def __init__(self, config_prefix, maxsize=1024, ttl=60):
+        self.config_prefix = config_prefix
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        """ Lee <PREFIJO>_SIZE y <PREFIJO>_TTL de la configuración de la aplicación. """
+        self.maxsize = app.config.get(self.config_prefix + '_SIZE', self.maxsize)
+        self.ttl = app.config.get(self.config_prefix + '_TTL', self.ttl)
+        self.clear()
+
+    def get(self, key):
+        """ Devuelve el valor guardado para `key` o None si no existe o ha caducado. """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """ Contadores de la caché: aciertos, fallos y número de entradas. """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+
+class PageCache(TTLCache):
+
+    def __init__(self, config_prefix, maxsize=256, ttl=300, wait=10):
+        super(PageCache, self).__init__(config_prefix, maxsize, ttl)
+        self.wait = wait
+        self._flights = {}  # clave -> Event del renderizado en curso
+        self._flights_lock = Lock()
+
+    def init_app(self, app):
+        super(PageCache, self).init_app(app)
+        self.wait = app.config.get(self.config_prefix + '_WAIT', self.wait)
+
+    def render_once(self, key, render):
+        """
+        Devuelve el cuerpo guardado para `key` o lo genera con `render()`. Si otro hilo ya está generando
+        la misma clave se espera a su resultado en lugar de renderizar otra vez (singleflight).
+        """
+        body = self.get(key)
+        if body is not None:
+            return body
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            lider = flight is None
+            if lider:
+                flight = self._flights[key] = Event()
+
+        if not lider:
+            flight.wait(self.wait)
+            body = self.get(key)
+            # Si el renderizado del otro hilo falló (o tardó demasiado) se renderiza aquí
+            return body if body is not None else render()
+
+        try:
+            body = render()
+            self.set(key, body)
+            return body
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.set()
+
+    def respond(self, key, version, last_modified, render, csrf=False):
+        """
+        Respuesta de la página `key` (tupla) para la versión de datos `version`, generada con `render()`.
+
+        La clave completa incluye al usuario que la ve y sus permisos y, con `csrf`, el token CSRF de la
+        sesión (páginas con formularios). Las páginas con mensajes flash pendientes no se guardan. Las
+        entradas caducan a los PAGE_CACHE_TTL segundos, de modo que los tokens CSRF de una página
+        guardada no llegan a caducar.
+        """
+        if session.get('_flashes'):
+            return render()
+
+        visitante = (current_user.id, current_user.permisos) if current_user.is_authenticated else None
+        if csrf:
+            from flask_wtf.csrf import generate_csrf
+            generate_csrf()  # Crear el token de la sesión antes de calcular la clave
+            visitante = (visitante, session.get('csrf_token'))
+        periodo = int(time.time() // self.ttl) if self.ttl > 0 else 0
+        key = key + (version, visitante, periodo)
+        etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+        response = current_app.response_class(mimetype='text/html')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if last_modified is not None:
+            response.last_modified = last_modified
+
+        # El navegador ya tiene esta versión: 304 sin renderizar la página
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+        response.set_data(self.render_once(etag, render))
+        return response
@@ -1,10 +1,186 @@
-from sqlalchemy import create_engine, Column, Integer, Float, \
-    String, Text, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import sessionmaker, relationship
+import os
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, Float, \
+    String, Text, Date, DateTime, Boolean, ForeignKey, Index, and_, or_, bindparam
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.exc import DBAPIError, DisconnectionError
 from sqlalchemy.ext.declarative import declarative_base
-from flask_sqlalchemy import SQLAlchemy
 
-engine = create_engine('sqlite:///app/databases/fays-web-dev.db', connect_args={'check_same_thread':False})
-Session = sessionmaker(bind=engine)
-session = Session()
+# Valores por defecto del pool de conexiones (se sobrescriben desde config.py)
+POOL_DEFAULTS = {
+    'SQLALCHEMY_POOL_SIZE': 5,
+    'SQLALCHEMY_MAX_OVERFLOW': 10,
+    'SQLALCHEMY_POOL_RECYCLE': 1800,
+    'SQLALCHEMY_POOL_PRE_PING': True,
+    'SQLITE_PRAGMAS': {'journal_mode': 'WAL', 'busy_timeout': 5000, 'synchronous': 'NORMAL'},
+}
+
+
+def build_engine(uri, options=None):
+    """
+    Crea el engine de la bbdd con un pool de conexiones configurable.
+
+    En SQLite se aplican además los PRAGMA indicados (WAL, busy_timeout...) en cada conexión nueva,
+    de forma que las lecturas no queden bloqueadas detrás de las escrituras.
+    """
+    options = dict(POOL_DEFAULTS, **(options or {}))
+    kwargs = {'pool_pre_ping': options['SQLALCHEMY_POOL_PRE_PING']}
+
+    if uri.startswith('sqlite'):
+        kwargs['connect_args'] = {'check_same_thread': False}
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            # Una bbdd en memoria solo existe dentro de su conexión: se comparte una única conexión.
+            kwargs['poolclass'] = StaticPool
+        else:
+            kwargs['poolclass'] = QueuePool
+
+    if kwargs.get('poolclass') is not StaticPool:
+        kwargs.update(pool_size=options['SQLALCHEMY_POOL_SIZE'],
+                      max_overflow=options['SQLALCHEMY_MAX_OVERFLOW'],
+                      pool_recycle=options['SQLALCHEMY_POOL_RECYCLE'])
+
+    new_engine = create_engine(uri, **kwargs)
+
+    # Una conexión abierta antes de un fork no se puede usar en el proceso hijo (comparten el socket o
+    # los descriptores del fichero SQLite): se descarta sin cerrarla y el pool abre otra.
+    @event.listens_for(new_engine, 'connect')
+    def record_pid(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(new_engine, 'checkout')
+    def check_pid(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info['pid'] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise DisconnectionError('Conexión del proceso {} usada en el proceso {}'.format(
+                connection_record.info['pid'], pid))
+
+    pragmas = options['SQLITE_PRAGMAS'] if new_engine.dialect.name == 'sqlite' else None
+    if pragmas:
+        @event.listens_for(new_engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in pragmas.items():
+                cursor.execute('PRAGMA {}={}'.format(pragma, value))
+            cursor.close()
+
+    return new_engine
+
+
+# Los engines se crean en init_app a partir de la configuración seleccionada en create_app()
+engine = None
+read_engine = None
+Session = sessionmaker()
+ReadSession = sessionmaker()
+
+# Una sesión por hilo/petición en lugar de una sesión global compartida por todos los hilos.
+# La sesión se elimina al terminar cada petición (ver init_app).
+session = scoped_session(Session)
+
+# Sesión para consultas de solo lectura. Si no se configura una bbdd de lectura (réplica) es la misma
+# sesión principal; en caso contrario apunta a SQLALCHEMY_READ_DATABASE_URI.
+read_session = session
 Base = declarative_base()
+
+# Metadatos del modelo para Flask-Migrate/Alembic (migrations/env.py)
+metadata = Base.metadata
+
+
+def init_app(app):
+    """
+    Crea los engines a partir de la configuración de la aplicación (SQLALCHEMY_DATABASE_URI y,
+    opcionalmente, SQLALCHEMY_READ_DATABASE_URI) y cierra las sesiones de cada petición al terminar.
+
+    Las escrituras siempre van al engine principal. Las consultas de solo lectura que usan
+    read_session van al engine de lectura si está configurado.
+    """
+    global engine, read_engine, read_session
+    options = {key: app.config[key] for key in POOL_DEFAULTS if key in app.config}
+
+    for old_engine in {engine, read_engine} - {None}:
+        old_engine.dispose()
+
+    engine = build_engine(app.config['SQLALCHEMY_DATABASE_URI'], options)
+    Session.configure(bind=engine)
+
+    read_uri = app.config.get('SQLALCHEMY_READ_DATABASE_URI')
+    if read_uri and read_uri != app.config['SQLALCHEMY_DATABASE_URI']:
+        read_engine = build_engine(read_uri, options)
+        ReadSession.configure(bind=read_engine)
+        read_session = scoped_session(ReadSession)
+    else:
+        read_engine = engine
+        read_session = session
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        session.remove()
+        if read_session is not session:
+            read_session.remove()
+
+
+def dispose_engines():
+    """
+    Cierra las sesiones y todas las conexiones de los pools. El proceso maestro de un servidor con
+    preload lo llama antes de crear los workers, de modo que ninguna conexión se hereda en el fork.
+    """
+    session.remove()
+    if read_session is not session:
+        read_session.remove()
+    for pool_engine in {engine, read_engine} - {None}:
+        pool_engine.dispose()
+
+
+def reset_after_fork():
+    """
+    Pools nuevos en el proceso hijo tras un fork. Los del padre se descartan sin cerrar sus conexiones:
+    cerrarlas desde el hijo afectaría a las del padre (en SQLite, a sus bloqueos y al fichero WAL).
+    """
+    for pool_engine in {engine, read_engine} - {None}:
+        pool_engine.pool = pool_engine.pool.recreate()
+
+
+def alembic_revision():
+    """ Revisión de Alembic registrada en la bbdd por `flask deploy`, o None si no existe. """
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text('SELECT version_num FROM alembic_version')).scalar()
+    except DBAPIError:
+        return None
+
+
+def ensure_schema(app):
+    """
+    Crea las tablas del modelo en una bbdd vacía.
+
+    Si la bbdd tiene revisión de Alembic, o tablas creadas antes de usar Alembic, el esquema lo
+    actualizan las migraciones (`flask deploy`): se evita la comprobación del esquema en cada arranque y
+    que create_all cree antes de tiempo (y vacías) las tablas nuevas que añade una migración pendiente.
+    """
+    if alembic_revision() is not None or engine.has_table('users'):
+        return
+    Base.metadata.create_all(engine)
+
+
+def matches_models():
+    """ True si la bbdd tiene todas las tablas y columnas del modelo actual. """
+    inspector = inspect(engine)
+    existentes = set(inspector.get_table_names())
+    for tabla in Base.metadata.sorted_tables:
+        if tabla.name not in existentes:
+            return False
+        columnas = {columna['name'] for columna in inspector.get_columns(tabla.name)}
+        if not set(tabla.columns.keys()) <= columnas:
+            return False
+    return True
+
+
+def detach(*instances):
+    """
+    Desvincula de la sesión de lectura los objetos que después se pueden modificar o asociar desde la
+    sesión principal (p. ej. current_user y su rol). Si no hay bbdd de lectura no hace nada.
+    """
+    if read_session is not session:
+        for instance in instances:
+            if instance is not None and instance in read_session:
+                read_session.expunge(instance)
@@ -6,9 +6,10 @@ Para ello, se crea el archivo decorator.py en el directorio de la aplicación.
 """
 
 from functools import wraps
-from flask import abort
+from flask import abort, request
 from flask_login import current_user
 from .models import Permission
+from . import admission
 
 def permission_required(permission):
     """ El primer decorador permite establecer un nivel específico de permisos necesarios para
@@ -25,4 +26,32 @@ def permission_required(permission):
     return decorator
 
 def admin_required(f):
-    return permission_required(Permission.ADMIN)(f)
\ No newline at end of file
+    return permission_required(Permission.ADMIN)(f)
+
+def limited(clase, methods=None):
+    """ Control de admisión de la clase de endpoint `clase` (ver app/admission.py y ADMISSION_LIMITS),
+        por IP y, si hay sesión, por usuario. Con `methods` solo se limitan esos métodos (p. ej. el POST
+        de un formulario y no el GET que lo muestra).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not admission.enabled or (methods and request.method not in methods):
+                return f(*args, **kwargs)
+            claves = [('ip', request.remote_addr)]
+            if current_user.is_authenticated:
+                claves.append(('user', current_user.id))
+            admission.acquire(clase, claves)
+            try:
+                respuesta = f(*args, **kwargs)
+            except BaseException:
+                admission.release(clase)
+                raise
+            # Una descarga en streaming sigue ocupando el hilo hasta que termina de enviarse
+            if getattr(respuesta, 'is_streamed', False):
+                respuesta.call_on_close(lambda: admission.release(clase))
+            else:
+                admission.release(clase)
+            return respuesta
+        return decorated_function
+    return decorator
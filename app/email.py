@@ -1,27 +1,23 @@
-from threading import Thread
 from flask import current_app, render_template
-from flask_mail import Message
-from . import mail
-import sys
+from . import db, outbox
 
-def send_async_email(app, msg):
-    try:
-        with app.app_context():
-            mail.send(msg)
-    except Exception as e:
-        print('Email de confirmación no enviado!\n',e,sep='', file=sys.stderr)
-    else:
-        print('Email de confirmación enviado correctamente!')
 
 def send_email(to, subject, template, **kwargs):
-    app = current_app._get_current_object()
-
-    msg = Message(app.config['OFFBRAND_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
-                  sender=app.config['OFFBRAND_MAIL_SENDER'], recipients=to)
-    msg.body = render_template(template + '.txt', **kwargs)
-    msg.html = render_template(template + '.html', **kwargs)
+    """
+    Guarda el email en la bandeja de salida y avisa a los workers de envío (ver app/outbox.py).
+    Devuelve el id del mensaje en la tabla email_outbox.
 
-    thr = Thread(target=send_async_email, args=[app,msg])
-    thr.start()
-    return thr
+    El mensaje se guarda en su propia transacción, no en la de db.session: queda confirmado (y se
+    enviará) aunque la petición haga después un rollback.
+    """
+    app = current_app._get_current_object()
+    recipients = [to] if isinstance(to, str) else list(to)
 
+    with db.engine.begin() as connection:
+        id = outbox.enqueue(connection, recipients,
+                            app.config['OFFBRAND_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
+                            body=render_template(template + '.txt', **kwargs),
+                            html=render_template(template + '.html', **kwargs),
+                            sender=app.config['OFFBRAND_MAIL_SENDER'])
+    outbox.notify()
+    return id
@@ -0,0 +1,95 @@
+"""
+Aviso de cambios en las tareas a las otras pestañas abiertas del usuario (Server-Sent Events).
+
+Las vistas que modifican tareas publican un evento {accion, id, version} con publish(). Cada pestaña de
+la agenda abierta mantiene una conexión a /manager_app/agenda/events que recibe los eventos de su
+usuario y actualiza solo la tarjeta afectada (manager.js).
+
+Los eventos se reparten en memoria dentro de cada proceso. Los cambios hechos en otro worker (o desde
+la CLI) se detectan leyendo la versión de los datos del usuario cada AGENDA_EVENTS_POLL_INTERVAL
+segundos, y se avisan sin acción para que la página ofrezca recargar.
+
+Cada conexión ocupa un hilo del worker mientras está abierta, por eso está desactivado por defecto
+(AGENDA_EVENTS) y cada conexión se cierra a los AGENDA_EVENTS_TIMEOUT segundos: el navegador vuelve a
+conectar solo, y una parada ordenada del servidor no espera a conexiones eternas.
+"""
+
+import json
+import time
+from queue import Queue, Empty, Full
+from threading import Lock
+from sqlalchemy import table, column, select
+from . import db
+
+users = table('users', column('id'), column('data_version'))
+
+
+class EventBroker(object):
+
+    def __init__(self, enabled=False, timeout=55, poll_interval=5, queue_size=100):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self._subscribers = {}  # usuario -> set de colas de sus conexiones abiertas
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('AGENDA_EVENTS', self.enabled)
+        self.timeout = app.config.get('AGENDA_EVENTS_TIMEOUT', self.timeout)
+        self.poll_interval = app.config.get('AGENDA_EVENTS_POLL_INTERVAL', self.poll_interval)
+
+    def publish(self, usuario, **evento):
+        """ Envía `evento` a las conexiones abiertas del usuario en este proceso. """
+        if not self.enabled:
+            return
+        with self._lock:
+            colas = list(self._subscribers.get(usuario, ()))
+        for cola in colas:
+            try:
+                cola.put_nowait(evento)
+            except Full:
+                # Cliente que no lee: se pierde el evento (el sondeo de la versión lo recupera)
+                pass
+
+    def _subscribe(self, usuario):
+        cola = Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(usuario, set()).add(cola)
+        return cola
+
+    def _unsubscribe(self, usuario, cola):
+        with self._lock:
+            colas = self._subscribers.get(usuario)
+            if colas is not None:
+                colas.discard(cola)
+                if not colas:
+                    del self._subscribers[usuario]
+
+    def _version(self, usuario):
+        with db.engine.connect() as connection:
+            return connection.execute(select([users.c.data_version]).where(users.c.id == usuario)).scalar()
+
+    def stream(self, usuario, version):
+        """
+        Generador con el cuerpo text/event-stream de una conexión del usuario, que la página abrió con
+        la versión de datos `version`. No usa el contexto de la petición.
+        """
+        cola = self._subscribe(usuario)
+        fin = time.monotonic() + self.timeout
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < fin:
+                try:
+                    evento = cola.get(timeout=self.poll_interval)
+                except Empty:
+                    actual = self._version(usuario)
+                    if actual is not None and actual > version:
+                        evento = {'version': actual}
+                    else:
+                        yield ': ping\n\n'
+                        continue
+                version = max(version, evento.get('version') or version)
+                yield 'data: {}\n\n'.format(json.dumps(evento))
+        finally:
+            self._unsubscribe(usuario, cola)
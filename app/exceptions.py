@@ -1,2 +1,16 @@
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
 class ValidationError(ValueError):
-    pass
\ No newline at end of file
+    pass
+
+class HashingBusy(ServiceUnavailable):
+    """ El pool de hashing de contraseñas está saturado. Flask responde 503 con Retry-After. """
+    description = 'Demasiadas operaciones de contraseña en curso. Inténtalo de nuevo en unos segundos.'
+
+class RateLimited(TooManyRequests):
+    """ El cliente (IP o usuario) ha superado el límite de peticiones de la clase. 429 con Retry-After. """
+    description = 'Demasiadas peticiones. Inténtalo de nuevo en unos segundos.'
+
+class Overloaded(ServiceUnavailable):
+    """ Demasiadas peticiones de la clase en curso en el worker. 503 con Retry-After. """
+    description = 'El servidor está ocupado. Inténtalo de nuevo en unos segundos.'
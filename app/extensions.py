@@ -3,6 +3,15 @@ from flask_mail import Mail
 from flask_login import LoginManager
 from flask_bootstrap import Bootstrap
 from flask_datepicker import datepicker
+from .assets import Assets
+from .avatars import AvatarCache
+from .cache import TTLCache, PageCache
+from .last_seen import LastSeenBuffer
+from .hashing import PasswordHasher
+from .outbox import Outbox
+from .telemetry import Telemetry
+from .events import EventBroker
+from .admission import AdmissionControl
 
 # Instanciar dependencias externas como objetos de la aplicación Python
 moment = Moment()
@@ -10,3 +19,33 @@ mail = Mail()
 login_manager = LoginManager()
 bootstrap = Bootstrap()
 datepicker = datepicker()
+
+# Ficheros estáticos empaquetados con huella de contenido (asset_url en las plantillas)
+assets = Assets()
+
+# Avatares generados localmente con caché en disco
+avatar_cache = AvatarCache()
+
+# Caché de identidad de usuarios (load_user) con su máscara de permisos
+identity_cache = TTLCache('IDENTITY_CACHE')
+
+# Caché de páginas renderizadas (perfil y agenda) por usuario y versión de datos
+page_cache = PageCache('PAGE_CACHE')
+
+# Escrituras agrupadas de users.last_seen
+last_seen_buffer = LastSeenBuffer()
+
+# Hashing de contraseñas en un pool de procesos acotado
+password_hasher = PasswordHasher()
+
+# Bandeja de salida de emails con workers de envío
+outbox = Outbox()
+
+# Telemetría de rendimiento por petición (/metrics)
+telemetry = Telemetry()
+
+# Aviso de cambios en las tareas a las otras pestañas del usuario (Server-Sent Events)
+events = EventBroker()
+
+# Control de admisión y limitación de peticiones de los endpoints caros
+admission = AdmissionControl()
@@ -0,0 +1,108 @@
+"""
+Hashing y verificación de contraseñas en un pool de procesos acotado.
+
+PBKDF2 es CPU intensivo: hacerlo en el hilo de la petición bloquea el hilo (y el GIL) y una ráfaga de
+logins deja sin servicio al resto de endpoints. Aquí se ejecuta en un ProcessPoolExecutor con
+PASSWORD_HASH_WORKERS procesos y como mucho PASSWORD_HASH_QUEUE_MAX operaciones en espera; por encima
+de ese límite se lanza HashingBusy (503 con Retry-After) en lugar de encolar sin límite. También si la
+operación tarda más de PASSWORD_HASH_TIMEOUT o si muere un proceso del pool (el pool se recrea en la
+siguiente llamada).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+from werkzeug.security import generate_password_hash, check_password_hash
+from .exceptions import HashingBusy
+
+
+class PasswordHasher(object):
+
+    def __init__(self):
+        self.method = 'pbkdf2:sha256:260000'
+        self.salt_length = 16
+        self.workers = 2
+        self.queue_max = 32
+        self.timeout = 30
+        self.retry_after = 2
+        self._executor = None
+        self._pid = None
+        self._slots = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', self.salt_length)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.queue_max = app.config.get('PASSWORD_HASH_QUEUE_MAX', self.queue_max)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self.retry_after = app.config.get('PASSWORD_HASH_RETRY_AFTER', self.retry_after)
+        self.shutdown()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """ True si el hash se generó con otros parámetros (método, iteraciones o longitud de sal). """
+        if not pwhash or pwhash.count('$') < 2:
+            return True
+        method, salt, _ = pwhash.split('$', 2)
+        return method != self.method or len(salt) != self.salt_length
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+            self._pid = None
+
+    def _get_executor(self):
+        # El pool se crea en el primer uso de cada proceso (también tras un fork del servidor)
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._slots = BoundedSemaphore(self.workers + self.queue_max)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, func, *args):
+        # Sin workers (p. ej. en testing) se ejecuta en el propio hilo
+        if not self.workers:
+            return func(*args)
+
+        executor = self._get_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingBusy(retry_after=self.retry_after)
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self._discard(executor)
+            raise HashingBusy(retry_after=self.retry_after)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HashingBusy(retry_after=self.retry_after)
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise HashingBusy(retry_after=self.retry_after)
+
+    def _discard(self, executor):
+        # Un proceso del pool ha muerto y el pool ya no admite trabajos: se recrea en la siguiente llamada
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._pid = None
@@ -0,0 +1,99 @@
+"""
+Escrituras agrupadas de users.last_seen.
+
+En lugar de un UPDATE por petición, before_request anota la hora en memoria (como mucho una vez por
+usuario cada LAST_SEEN_RESOLUTION segundos) y las horas pendientes se escriben con un único UPDATE
+por lotes cuando se alcanza LAST_SEEN_FLUSH_SIZE usuarios o pasan LAST_SEEN_FLUSH_INTERVAL segundos.
+Lo pendiente se escribe también al terminar el proceso.
+"""
+
+import atexit
+import logging
+import time
+from datetime import datetime
+from threading import Lock, Thread
+from sqlalchemy import table, column, bindparam
+from . import db
+
+logger = logging.getLogger(__name__)
+
+users = table('users', column('id'), column('last_seen'))
+
+
+class LastSeenBuffer(object):
+
+    def __init__(self, resolution=60, flush_interval=30, flush_size=500):
+        self.resolution = resolution
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._pending = {}   # user_id -> datetime pendiente de escribir
+        self._recorded = {}  # user_id -> instante (monotonic) de la última anotación
+        self._last_flush = time.monotonic()
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._thread = None
+        self._atexit_registered = False
+
+    def init_app(self, app):
+        self.resolution = app.config.get('LAST_SEEN_RESOLUTION', self.resolution)
+        self.flush_interval = app.config.get('LAST_SEEN_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_size = app.config.get('LAST_SEEN_FLUSH_SIZE', self.flush_size)
+        # init_app se llama en cada create_app: flush se registra una sola vez
+        if not self._atexit_registered:
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    def touch(self, user_id):
+        """ Anota que el usuario se ha visto ahora (si no se anotó en los últimos `resolution` segundos). """
+        ahora = time.monotonic()
+        with self._lock:
+            anterior = self._recorded.get(user_id)
+            if anterior is not None and ahora - anterior < self.resolution:
+                return
+            self._recorded[user_id] = ahora
+            self._pending[user_id] = datetime.utcnow()
+            lleno = len(self._pending) >= self.flush_size
+
+        self._ensure_thread()
+        if lleno or ahora - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """ Escribe todas las horas pendientes con un único UPDATE (executemany). """
+        with self._flush_lock:
+            with self._lock:
+                pendientes, self._pending = self._pending, {}
+                self._last_flush = ahora = time.monotonic()
+                # Olvidar a los usuarios cuya última anotación ya no limita la siguiente
+                self._recorded = {user_id: instante for user_id, instante in self._recorded.items()
+                                  if ahora - instante < self.resolution}
+            if not pendientes or db.engine is None:
+                return 0
+
+            update = users.update().where(users.c.id == bindparam('b_id')) \
+                .values(last_seen=bindparam('b_last_seen'))
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(update, [{'b_id': user_id, 'b_last_seen': last_seen}
+                                                for user_id, last_seen in pendientes.items()])
+            except Exception:
+                logger.exception('No se ha podido actualizar last_seen de %d usuarios', len(pendientes))
+                # Volver a dejar pendientes las horas no escritas (sin pisar otras más recientes)
+                with self._lock:
+                    for user_id, last_seen in pendientes.items():
+                        self._pending.setdefault(user_id, last_seen)
+                return 0
+            return len(pendientes)
+
+    def _ensure_thread(self):
+        """ Hilo que vacía el buffer periódicamente aunque no lleguen más peticiones. """
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = Thread(target=self._run, name='last-seen-flush', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
@@ -0,0 +1,39 @@
+"""
+Carga perezosa de las vistas de los planos.
+
+Los planos registran sus rutas apuntando a un LazyView, de forma que el módulo views.py (y sus forms,
+wtforms, email...) solo se importa la primera vez que se atiende una de sus rutas, y no al arrancar
+cada worker o cada test.
+"""
+
+from werkzeug.utils import import_string, cached_property
+
+
+class LazyView(object):
+    """ Vista que importa la función real la primera vez que se llama. """
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def lazy_view(blueprint, name):
+    """
+    Devuelve un LazyView para la función `name` del módulo views del plano, o de otro módulo del
+    plano si `name` es de la forma 'modulo.funcion'.
+    """
+    if '.' not in name:
+        name = 'views.' + name
+    return LazyView('{}.{}'.format(blueprint.import_name, name))
+
+
+def lazy_route(blueprint, rule, name, **options):
+    """ Equivalente a @blueprint.route(rule, **options) sobre la función `name` (ver lazy_view). """
+    blueprint.add_url_rule(rule, view_func=lazy_view(blueprint, name), **options)
@@ -1,8 +1,15 @@
 # Crear el plano (blueprint)
 from flask import Blueprint
+from ..lazy import lazy_route
 
 # Crear plano de autorización de la aplicación
 main = Blueprint('main',__name__)
 
-# Importar vistas del plano
-from . import views
\ No newline at end of file
+# Rutas del plano. Las vistas (views.py) se importan la primera vez que se usan.
+lazy_route(main, '/', 'index')
+lazy_route(main, '/home', 'home')
+lazy_route(main, '/user/<username>', 'user')
+lazy_route(main, '/edit-profile', 'edit_profile', methods=['GET', 'POST'])
+lazy_route(main, '/edit-profile/<int:id>', 'edit_profile_admin', methods=['GET', 'POST'])
+lazy_route(main, '/avatar/<hash>/<int:size>.png', 'avatar')
+lazy_route(main, '/metrics', 'metrics')
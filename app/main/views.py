@@ -2,31 +2,69 @@
 Main endpoints
 """
 
-from flask import render_template, redirect, url_for, flash
+import re
+from flask import render_template, redirect, url_for, flash, abort, send_file, current_app
 from flask_login import login_required, current_user
-from . import main
-from .. import db
+from .. import db, identity_cache, page_cache, avatar_cache, outbox, telemetry, admission
+from ..telemetry import gauge
 from ..models import User, Role
 from .forms import EditProfileAdminForm, EditProfileForm
 from ..decorators import admin_required
 
-@main.route('/')
 def index():
     return render_template('index.html') #'Hello World!', 200
 
-@main.route('/home')
 def home():
     return render_template('home.html') #'Hello World!', 200
 
-@main.route('/user/<username>')
 def user(username):
-    user = db.session.query(User).filter_by(username=username).first() # 404 if user is not found
-    if not user:
+    version = User.data_version_of(username=username)
+    if not version:
         return render_template('404.html')
 
-    return render_template('user.html', user=user)
+    def render():
+        user = db.read_session.query(User).filter_by(username=username).first()
+        return render_template('user.html', user=user)
+
+    # La página muestra last_seen: forma parte de la versión
+    id, data_version, data_updated, last_seen = version
+    last_modified = max(filter(None, (data_updated, last_seen)), default=None)
+    return page_cache.respond(('user', id), (data_version, last_seen), last_modified, render)
+
+def avatar(hash, size):
+    """ Identicon de `hash` generado localmente (ver app/avatars.py). La URL nunca cambia de contenido. """
+    if not re.fullmatch('[0-9a-f]{32}', hash) or not avatar_cache.min_size <= size <= avatar_cache.max_size:
+        abort(404)
+
+    max_age = current_app.config['AVATAR_MAX_AGE']
+    response = send_file(avatar_cache.path(hash, size), mimetype='image/png', conditional=True, cache_timeout=max_age)
+    response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(max_age)
+    return response
+
+@login_required
+@admin_required
+def metrics():
+    """ Métricas de rendimiento en formato de texto de Prometheus (solo administradores). """
+    caches = {'identity': identity_cache.stats(), 'page': page_cache.stats()}
+    outbox_stats = outbox.stats()
+    admission_stats = admission.stats()
+    metricas = [telemetry.exposition(),
+                gauge('fays_cache_hits', 'Aciertos de la caché en este proceso.',
+                      {(nombre,): stats['hits'] for nombre, stats in caches.items()}, ('cache',)),
+                gauge('fays_cache_misses', 'Fallos de la caché en este proceso.',
+                      {(nombre,): stats['misses'] for nombre, stats in caches.items()}, ('cache',)),
+                gauge('fays_cache_entries', 'Entradas de la caché en este proceso.',
+                      {(nombre,): stats['size'] for nombre, stats in caches.items()}, ('cache',)),
+                gauge('fays_outbox_queue_depth', 'Emails pendientes de enviar.', {(): outbox_stats['queue_depth']}),
+                gauge('fays_outbox_failed', 'Emails que no se han podido enviar.', {(): outbox_stats['failed']}),
+                gauge('fays_outbox_oldest_pending_seconds', 'Antigüedad del email pendiente más antiguo.',
+                      {(): outbox_stats['oldest_pending_age']}),
+                gauge('fays_admission_in_flight', 'Peticiones en curso por clase de endpoint en este proceso.',
+                      {(clase,): valor for clase, valor in admission_stats['in_flight'].items()}, ('clase',)),
+                gauge('fays_admission_rejected', 'Peticiones rechazadas (429/503) en este proceso.',
+                      admission_stats['rejected'], ('clase', 'motivo'))]
+    return current_app.response_class('\n'.join(metricas) + '\n', mimetype='text/plain; version=0.0.4')
 
-@main.route('/edit-profile', methods=['GET','POST'])
 @login_required
 def edit_profile():
     form = EditProfileForm()
@@ -34,14 +72,15 @@ def edit_profile():
         current_user.name = form.name.data
         current_user.about_me = form.about_me.data
         db.session.add(current_user._get_current_object())
+        User.touch_data(current_user.id)
         db.session.commit()
+        identity_cache.invalidate(current_user.id)
         flash('Your profile has been updated.')
         return redirect(url_for('.user', username=current_user.username))
     form.name.data = current_user.name
     form.about_me.data = current_user.about_me
     return render_template('edit_profile.html', form=form)
 
-@main.route('/edit-profile/<int:id>', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def edit_profile_admin(id):
@@ -55,7 +94,9 @@ def edit_profile_admin(id):
         user.name = form.name.data
         user.about_me = form.about_me.data
         db.session.add(user)
+        User.touch_data(user.id)
         db.session.commit()
+        identity_cache.invalidate(user.id)
         flash('The profile has been updated.')
         return redirect(url_for('.user', username=user.username))
     form.email.data = user.email
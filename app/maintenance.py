@@ -0,0 +1,197 @@
+"""
+Operaciones de mantenimiento de la bbdd que recorren tablas grandes por lotes.
+
+Cada lote se ejecuta en su propia transacción corta para no bloquear la tabla durante toda la
+operación, y las operaciones se pueden reanudar desde el último id procesado.
+"""
+
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import table, column, select, bindparam, func, case, true, text, union_all, String
+from . import db
+
+# Formatos de fecha aceptados en los datos antiguos de la tabla manager (fecha guardada como texto)
+FORMATOS_FECHA = ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y/%m/%d', '%d/%m/%Y', '%d-%m-%Y')
+
+
+def parse_fecha(valor):
+    """ Convierte una fecha guardada como texto a date, o None si no se puede interpretar. """
+    if valor is None or isinstance(valor, date):
+        return valor
+    valor = valor.strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def backfill_task_dates(batch_size=1000, desde_id=0, pausa=0.0):
+    """
+    Normaliza fecha_inicio y fecha_final de la tabla manager al formato ISO (YYYY-MM-DD) de las
+    columnas Date. Los valores que no se pueden interpretar se dejan a NULL.
+
+    Se procesan `batch_size` filas por transacción en orden de id a partir de `desde_id`, con una
+    `pausa` opcional (segundos) entre lotes. Es un generador que devuelve (último_id, filas_modificadas)
+    tras cada lote, de modo que la operación se puede reanudar desde el último id.
+    """
+    # Columnas como texto: las filas antiguas no se pueden leer con el tipo Date del modelo
+    manager = table('manager', column('id'), column('fecha_inicio', String), column('fecha_final', String))
+    update = manager.update().where(manager.c.id == bindparam('b_id')) \
+        .values(fecha_inicio=bindparam('b_inicio'), fecha_final=bindparam('b_final'))
+
+    ultimo_id = desde_id
+    while True:
+        with db.engine.begin() as connection:
+            filas = connection.execute(select([manager.c.id, manager.c.fecha_inicio, manager.c.fecha_final])
+                                       .where(manager.c.id > ultimo_id)
+                                       .order_by(manager.c.id)
+                                       .limit(batch_size)).fetchall()
+            if not filas:
+                return
+
+            cambios = []
+            for id, inicio, final in filas:
+                nuevo_inicio, nuevo_final = parse_fecha(inicio), parse_fecha(final)
+                nuevo_inicio = nuevo_inicio.isoformat() if nuevo_inicio else None
+                nuevo_final = nuevo_final.isoformat() if nuevo_final else None
+                if (nuevo_inicio, nuevo_final) != (inicio, final):
+                    cambios.append({'b_id': id, 'b_inicio': nuevo_inicio, 'b_final': nuevo_final})
+            if cambios:
+                connection.execute(update, cambios)
+
+        ultimo_id = filas[-1][0]
+        yield ultimo_id, len(cambios)
+
+        if pausa:
+            time.sleep(pausa)
+
+
+def rebuild_task_summary(batch_size=500, usuario=None):
+    """
+    Recalcula la tabla task_summary a partir de las tablas manager y manager_archive, por lotes de
+    `batch_size` usuarios (o solo el `usuario` indicado). Los lotes se toman de la tabla users en orden de
+    id, y las tareas de cada lote se leen con los índices por usuario de las dos tablas. Cada lote borra
+    y vuelve a insertar el resumen de sus usuarios en una transacción. Es un generador que devuelve
+    (último_usuario, filas_de_resumen) tras cada lote.
+    """
+    columnas = ('usuario', 'tipo', 'finalizada', 'tiempo_empleado', 'duracion_total')
+    tablas = [table(nombre, *(column(c) for c in columnas)) for nombre in ('manager', 'manager_archive')]
+    users = table('users', column('id'))
+    summary = table('task_summary', column('usuario'), column('tipo'), column('total'), column('finalizadas'),
+                    column('tiempo_empleado'), column('duracion_total'))
+
+    ultimo = None
+    while True:
+        with db.engine.begin() as connection:
+            if usuario is not None:
+                usuarios = [usuario] if ultimo is None else []
+            else:
+                consulta = select([users.c.id])
+                if ultimo is not None:
+                    consulta = consulta.where(users.c.id > ultimo)
+                usuarios = [fila[0] for fila in connection.execute(consulta.order_by(users.c.id).limit(batch_size))]
+            if not usuarios:
+                return
+
+            connection.execute(summary.delete().where(summary.c.usuario.in_(usuarios)))
+            # El filtro por usuario va en cada parte de la unión para que use el índice de su tabla
+            tareas = union_all(*(select([tabla]).where(tabla.c.usuario.in_(usuarios)) for tabla in tablas)) \
+                .alias('tareas')
+            agregado = select([tareas.c.usuario,
+                               tareas.c.tipo,
+                               func.count(),
+                               func.sum(case([(tareas.c.finalizada == true(), 1)], else_=0)),
+                               func.coalesce(func.sum(tareas.c.tiempo_empleado), 0),
+                               func.coalesce(func.sum(tareas.c.duracion_total), 0)]) \
+                .group_by(tareas.c.usuario, tareas.c.tipo)
+            insertadas = connection.execute(summary.insert().from_select(
+                ['usuario', 'tipo', 'total', 'finalizadas', 'tiempo_empleado', 'duracion_total'], agregado)).rowcount
+
+        ultimo = usuarios[-1]
+        yield ultimo, insertadas
+
+
+def task_summary_missing():
+    """ True si task_summary está vacía pero hay tareas (tabla recién creada por una migración o create_all). """
+    with db.engine.connect() as connection:
+        return connection.execute(text('SELECT 1 FROM task_summary LIMIT 1')).scalar() is None and \
+            connection.execute(text('SELECT 1 FROM manager LIMIT 1')).scalar() is not None
+
+
+def rebuild_task_search():
+    """
+    Reconstruye desde la tabla manager el índice de búsqueda task_search (SQLite FTS5), creándolo con
+    sus triggers si no existe, y lo compacta. Devuelve el número de tareas indexadas.
+
+    No se hace por lotes: el índice tiene que coincidir exactamente con la tabla, y un índice a medias
+    que los triggers siguen modificando entre lote y lote quedaría corrupto. La reconstrucción es un
+    único comando de FTS5 en una transacción.
+    """
+    from .models import TASK_SEARCH_DDL
+
+    with db.engine.begin() as connection:
+        for ddl in TASK_SEARCH_DDL:
+            connection.execute(text(ddl))
+        connection.execute(text("INSERT INTO task_search (task_search) VALUES ('rebuild')"))
+        total = connection.execute(text('SELECT COUNT(*) FROM manager')).scalar()
+
+    # Une los segmentos del índice en uno solo (consultas más rápidas)
+    with db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO task_search (task_search) VALUES ('optimize')"))
+    return total
+
+
+def check_task_search():
+    """ Comprueba que el índice task_search coincide con la tabla manager (DatabaseError si no). """
+    with db.engine.connect() as connection:
+        connection.execute(text("INSERT INTO task_search (task_search, rank) VALUES ('integrity-check', 1)"))
+
+
+def archive_tasks(dias=90, batch_size=500, desde_id=0, pausa=0.0):
+    """
+    Mueve a la tabla manager_archive las tareas finalizadas cuya fecha final es anterior a hace `dias`
+    días. Cada lote de `batch_size` tareas (en orden de id a partir de `desde_id`) se copia y se borra de
+    manager en una transacción, y se incrementa la versión de los datos de sus usuarios. Los triggers
+    mantienen task_summary (las archivadas siguen contando) y el índice de búsqueda (no las incluye).
+
+    Es un generador que devuelve (último_id, tareas_archivadas) tras cada lote, con una `pausa` opcional
+    (segundos) entre lotes para no acaparar la escritura de la bbdd.
+    """
+    from .models import TASK_HISTORY_COLUMNS
+
+    manager = table('manager', *(column(c) for c in TASK_HISTORY_COLUMNS))
+    archive = table('manager_archive', *(column(c) for c in TASK_HISTORY_COLUMNS + ('archivada',)))
+    users = table('users', column('id'), column('data_version'), column('data_updated'))
+    limite = date.today() - timedelta(days=dias)
+
+    ultimo_id = desde_id
+    while True:
+        with db.engine.begin() as connection:
+            ids = [fila[0] for fila in connection.execute(
+                select([manager.c.id]).where(manager.c.id > ultimo_id).order_by(manager.c.id).limit(batch_size))]
+            if not ids:
+                return
+
+            # La condición se vuelve a comprobar al copiar y al borrar: la tarea puede haber cambiado
+            archivables = (manager.c.id.in_(ids) & (manager.c.finalizada == true()) &
+                           (manager.c.fecha_final < limite))
+            ahora = datetime.utcnow()
+            archivadas = connection.execute(archive.insert().from_select(
+                TASK_HISTORY_COLUMNS + ('archivada',),
+                select([manager.c[c] for c in TASK_HISTORY_COLUMNS] + [bindparam('ahora', ahora)])
+                .where(archivables))).rowcount
+            if archivadas:
+                usuarios = [fila[0] for fila in connection.execute(
+                    select([manager.c.usuario]).distinct().where(archivables))]
+                connection.execute(manager.delete().where(archivables))
+                # Las páginas en caché de los usuarios afectados dejan de ser válidas
+                connection.execute(users.update().where(users.c.id.in_(usuarios))
+                                   .values(data_version=users.c.data_version + 1, data_updated=ahora))
+
+        ultimo_id = ids[-1]
+        yield ultimo_id, archivadas
+
+        if pausa:
+            time.sleep(pausa)
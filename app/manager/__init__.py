@@ -1,7 +1,24 @@
 from flask import Blueprint
+from ..lazy import lazy_route
 
 # Crear plano de autorización de la aplicación
 manager_app = Blueprint('manager_app',__name__)
 
-# Importar vistas del plano
-from . import views
\ No newline at end of file
+# Rutas del plano. Las vistas (views.py) se importan la primera vez que se usan.
+lazy_route(manager_app, '/notebook', 'notebook', methods=['GET', 'POST'])
+lazy_route(manager_app, '/agenda', 'agenda', methods=['GET', 'POST'])
+lazy_route(manager_app, '/agenda/update/id=<id>', 'agenda_update', methods=['GET', 'POST'])
+lazy_route(manager_app, '/agenda/delete/id=<id>', 'agenda_delete', methods=['POST'])
+lazy_route(manager_app, '/agenda/batch', 'agenda_batch', methods=['POST'])
+lazy_route(manager_app, '/agenda/events', 'agenda_events')
+lazy_route(manager_app, '/history', 'history')
+
+# Descargas de la agenda (downloads.py)
+lazy_route(manager_app, '/agenda.csv', 'downloads.agenda_csv')
+lazy_route(manager_app, '/agenda.ics', 'downloads.agenda_ics')
+
+# API JSON de tareas (api.py)
+lazy_route(manager_app, '/api/tasks', 'api.list_tasks', methods=['GET'])
+lazy_route(manager_app, '/api/tasks', 'api.create_tasks', methods=['POST'])
+lazy_route(manager_app, '/api/summary', 'api.summary', methods=['GET'])
+lazy_route(manager_app, '/api/search', 'api.search', methods=['GET'])
@@ -0,0 +1,175 @@
+"""
+API JSON de tareas del manager.
+
+GET  /manager_app/api/tasks   Tareas del usuario (paginación por cursor, ?fields= para elegir columnas).
+                              Responde con ETag: si coincide con If-None-Match devuelve 304 sin cuerpo.
+POST /manager_app/api/tasks   Alta de varias tareas con un único INSERT multi-fila.
+GET  /manager_app/api/summary Carga de trabajo del usuario por tipo ABC (tabla task_summary).
+GET  /manager_app/api/search  Búsqueda de texto en las tareas del usuario (?q=), por relevancia.
+                              Filtros ?tipo= y ?estado=pendientes|finalizadas, y ?fields= y ?limit=.
+"""
+
+import json
+import math
+from datetime import date
+from flask import request, current_app
+from flask_login import login_required, current_user
+from ..models import User, Task, TaskSummary, ClasificadorTareasABC
+from ..exceptions import ValidationError
+from ..decorators import limited
+from .. import db, events
+
+# Columnas que se pueden pedir con ?fields=
+API_FIELDS = ('id', 'tarea', 'tipo', 'tiempo_empleado', 'duracion_total', 'finalizada', 'fecha_inicio', 'fecha_final')
+
+
+def _json_response(payload, status=200):
+    """ Respuesta JSON compacta (sin espacios ni sangría). """
+    body = json.dumps(payload, separators=(',', ':'), default=lambda value: value.isoformat())
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+
+def _error(mensaje, status=400):
+    return _json_response({'error': mensaje}, status)
+
+
+def _parse_fields(fields):
+    if not fields:
+        return API_FIELDS
+    fields = tuple(field.strip() for field in fields.split(',') if field.strip())
+    desconocidos = set(fields) - set(API_FIELDS)
+    if desconocidos:
+        raise ValidationError('Campos desconocidos: {}'.format(', '.join(sorted(desconocidos))))
+    return fields
+
+
+@login_required
+def list_tasks():
+    try:
+        fields = _parse_fields(request.args.get('fields'))
+    except ValidationError as e:
+        return _error(str(e))
+
+    limite = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    limite = max(1, min(limite, current_app.config['API_PAGE_SIZE_MAX']))
+
+    # Solo se leen las columnas pedidas (más fecha_final e id, necesarias para el cursor)
+    columnas = [getattr(Task, field) for field in fields]
+    query = db.read_session.query(Task.id, Task.fecha_final, *columnas).filter(Task.usuario == current_user.id)
+
+    query = Task.despues_de(query, request.args.get('cursor'))
+    filas = query.order_by(Task.fecha_final, Task.id).limit(limite + 1).all()
+    cursor = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        cursor = Task.encode_cursor(filas[-1][1], filas[-1][0])
+
+    tasks = [dict(zip(fields, fila[2:])) for fila in filas]
+    response = _json_response({'tasks': tasks, 'next_cursor': cursor})
+
+    # Validación condicional: ETag del cuerpo y 304 si el cliente ya tiene esta versión
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def _parse_tarea(datos, tipos):
+    """ Valida una tarea del cuerpo de la petición y devuelve la fila a insertar. """
+    if not isinstance(datos, dict):
+        raise ValidationError('Cada tarea debe ser un objeto JSON')
+
+    tarea = datos.get('tarea')
+    if not isinstance(tarea, str) or not tarea.strip():
+        raise ValidationError('"tarea" es obligatorio')
+    if len(tarea.strip()) > Task.tarea.type.length:
+        raise ValidationError('"tarea" admite como mucho {} caracteres'.format(Task.tarea.type.length))
+    if datos.get('tipo') not in tipos:
+        raise ValidationError('"tipo" debe ser uno de: {}'.format(', '.join(sorted(tipos))))
+
+    duracion_total = datos.get('duracion_total')
+    tiempo_empleado = datos.get('tiempo_empleado')
+    if tiempo_empleado is None:
+        tiempo_empleado = 0
+    for nombre, valor in (('duracion_total', duracion_total), ('tiempo_empleado', tiempo_empleado)):
+        if not isinstance(valor, (int, float)) or isinstance(valor, bool) or not math.isfinite(valor):
+            raise ValidationError('"{}" debe ser un número: {!r}'.format(nombre, datos))
+    finalizada = datos.get('finalizada', False)
+    if not isinstance(finalizada, bool):
+        raise ValidationError('"finalizada" debe ser true o false: {!r}'.format(datos))
+
+    try:
+        fecha_inicio = date.fromisoformat(datos['fecha_inicio']) if datos.get('fecha_inicio') else None
+        fecha_final = date.fromisoformat(datos['fecha_final']) if datos.get('fecha_final') else None
+    except (TypeError, ValueError):
+        raise ValidationError('Tarea no válida: {!r}'.format(datos))
+
+    if fecha_inicio and fecha_final and fecha_inicio > fecha_final:
+        raise ValidationError('La fecha de inicio es posterior a la fecha final: {!r}'.format(datos))
+
+    return {'usuario': current_user.id,
+            'tarea': tarea.strip().title(),
+            'tipo': datos['tipo'],
+            'tiempo_empleado': float(tiempo_empleado),
+            'duracion_total': float(duracion_total),
+            'finalizada': finalizada,
+            'fecha_inicio': fecha_inicio,
+            'fecha_final': fecha_final}
+
+
+@login_required
+@limited('write')
+def create_tasks():
+    if not request.is_json:
+        return _error('Se esperaba application/json', 415)
+
+    datos = request.get_json(silent=True)
+    tareas = datos.get('tasks') if isinstance(datos, dict) else datos
+    if not isinstance(tareas, list) or not tareas:
+        return _error('Se esperaba una lista de tareas (o {"tasks": [...]})')
+    if len(tareas) > current_app.config['API_BULK_MAX']:
+        return _error('Como máximo {} tareas por petición'.format(current_app.config['API_BULK_MAX']))
+
+    tipos = ClasificadorTareasABC.tipos()
+    try:
+        filas = [_parse_tarea(tarea, tipos) for tarea in tareas]
+    except ValidationError as e:
+        return _error(str(e))
+
+    # Un único INSERT ... VALUES (...), (...), ... para todo el lote
+    db.session.execute(Task.__table__.insert().values(filas))
+    User.touch_data(current_user.id)
+    db.session.commit()
+    events.publish(current_user.id, accion='create', id=None)
+
+    return _json_response({'created': len(filas)}, 201)
+
+
+@login_required
+def summary():
+    response = _json_response(TaskSummary.resumen(current_user.id))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@login_required
+def search():
+    try:
+        fields = _parse_fields(request.args.get('fields'))
+    except ValidationError as e:
+        return _error(str(e))
+
+    texto = request.args.get('q', '').strip()
+    if not texto:
+        return _error('"q" es obligatorio')
+    tipo = request.args.get('tipo') or None
+    if tipo is not None and tipo not in ClasificadorTareasABC.tipos():
+        return _error('Tipo de tarea desconocido: {}'.format(tipo))
+    finalizada = {'finalizadas': True, 'pendientes': False}.get(request.args.get('estado'))
+
+    limite = request.args.get('limit', current_app.config['API_SEARCH_SIZE'], type=int)
+    limite = max(1, min(limite, current_app.config['API_PAGE_SIZE_MAX']))
+
+    tareas = Task.buscar(current_user.id, texto, tipo, finalizada, limite)
+    return _json_response({'tasks': [{field: getattr(tarea, field) for field in fields} for tarea in tareas],
+                           'engine': Task.motor_busqueda()})
@@ -0,0 +1,196 @@
+"""
+Descarga de la agenda del usuario en CSV y en iCalendar.
+
+GET /manager_app/agenda.csv  Tareas del usuario en CSV.
+GET /manager_app/agenda.ics  Tareas con fecha como eventos de día completo (para importar en un calendario).
+
+Filtros (los mismos que la agenda): ?estado=pendientes|finalizadas, ?tipo=, ?vencimiento=semana|vencidas
+y el intervalo de fecha final ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD (hasta excluido).
+
+El cuerpo se genera mientras se envía: las filas se leen de un cursor de AGENDA_EXPORT_BATCH_SIZE en
+AGENDA_EXPORT_BATCH_SIZE sin crear objetos Task, de modo que la memoria no depende del número de
+tareas. El ETag se calcula con la versión de los datos del usuario y los filtros, sin leer las tareas:
+si coincide con If-None-Match se responde 304 sin tocar la tabla.
+"""
+
+import csv
+import hashlib
+import io
+from datetime import date, datetime, timedelta
+from flask import request, current_app, abort
+from flask_login import login_required, current_user
+from sqlalchemy import select
+from ..models import User, Task, ClasificadorTareasABC
+from .. import db
+from ..decorators import limited
+
+COLUMNAS = ('id', 'tarea', 'tipo', 'tiempo_empleado', 'duracion_total', 'finalizada', 'fecha_inicio', 'fecha_final')
+
+
+def _fecha(nombre):
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        abort(400, '{} debe ser una fecha YYYY-MM-DD'.format(nombre))
+
+
+def _filtros():
+    """ (finalizada, tipo, desde, hasta) a partir de los argumentos de la petición. """
+    finalizada = {'finalizadas': True, 'pendientes': False}.get(request.args.get('estado'))
+    tipo = request.args.get('tipo')
+    tipo = tipo if tipo in ClasificadorTareasABC.tipos() else None
+    desde, hasta = _fecha('desde'), _fecha('hasta')
+
+    vencimiento = request.args.get('vencimiento')
+    if vencimiento == 'semana':
+        desde, hasta = Task.semana()
+        finalizada = False
+    elif vencimiento == 'vencidas':
+        hasta = date.today()
+        finalizada = False
+    return finalizada, tipo, desde, hasta
+
+
+def _consulta(usuario, finalizada, tipo, desde, hasta, solo_con_fecha=False):
+    tabla = Task.__table__
+    consulta = select([tabla.c[columna] for columna in COLUMNAS]).where(tabla.c.usuario == usuario)
+    if finalizada is not None:
+        consulta = consulta.where(tabla.c.finalizada == finalizada)
+    if tipo is not None:
+        consulta = consulta.where(tabla.c.tipo == tipo)
+    if desde is not None:
+        consulta = consulta.where(tabla.c.fecha_final >= desde)
+    if hasta is not None:
+        consulta = consulta.where(tabla.c.fecha_final < hasta)
+    if solo_con_fecha:
+        consulta = consulta.where(tabla.c.fecha_final.isnot(None))
+    return consulta.order_by(tabla.c.fecha_final, tabla.c.id)
+
+
+def _lotes(consulta, batch_size):
+    """ Genera las filas de `consulta` por lotes, con un cursor abierto solo mientras dura la descarga. """
+    with db.read_engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(consulta)
+        while True:
+            filas = result.fetchmany(batch_size)
+            if not filas:
+                break
+            yield filas
+
+
+def _respuesta(formato, mimetype, generar):
+    """
+    Respuesta en streaming con el cuerpo de `generar(filtros, data_updated, batch_size)`, o 304 si el
+    cliente ya tiene la versión actual.
+    """
+    filtros = _filtros()
+    _, data_version, data_updated, _ = User.data_version_of(id=current_user.id)
+    # Con vencimiento el resultado depende también del día
+    clave = (formato, current_user.id, data_version, filtros, date.today())
+
+    response = current_app.response_class(mimetype=mimetype)
+    response.set_etag(hashlib.sha1(repr(clave).encode('utf-8')).hexdigest())
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Content-Disposition'] = 'attachment; filename=agenda.{}'.format(formato)
+    if data_updated is not None:
+        response.last_modified = data_updated
+
+    response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    # El cuerpo se genera después de terminar la petición: el generador no puede usar su contexto.
+    # make_conditional ha calculado Content-Length con el cuerpo vacío: sin la cabecera el cuerpo se envía
+    # hasta cerrar la conexión (o por chunks)
+    response.response = generar(filtros, data_updated, current_app.config['AGENDA_EXPORT_BATCH_SIZE'])
+    response.headers.pop('Content-Length', None)
+    return response
+
+
+def _csv(filas_por_lote):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\r\n')
+    writer.writerow(COLUMNAS)
+    yield buffer.getvalue()
+    for filas in filas_por_lote:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(filas)
+        yield buffer.getvalue()
+
+
+@login_required
+@limited('export')
+def agenda_csv():
+    usuario = current_user.id
+
+    def generar(filtros, data_updated, batch_size):
+        return _csv(_lotes(_consulta(usuario, *filtros), batch_size))
+
+    return _respuesta('csv', 'text/csv', generar)
+
+
+def _texto_ical(texto):
+    """ Escapa un valor de texto de iCalendar (RFC 5545, 3.3.11). """
+    return str(texto).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _linea_ical(linea):
+    """ Línea terminada en CRLF y plegada cada 75 octetos como pide RFC 5545. """
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea + '\r\n'
+    partes, actual = [], ''
+    for caracter in linea:
+        limite = 75 if not partes else 74  # Las líneas de continuación empiezan con un espacio
+        if len((actual + caracter).encode('utf-8')) > limite:
+            partes.append(actual)
+            actual = ''
+        actual += caracter
+    partes.append(actual)
+    return '\r\n '.join(partes) + '\r\n'
+
+
+def _ics(filas_por_lote, host, dtstamp):
+    tipos = ClasificadorTareasABC.tipos()
+    yield ''.join(_linea_ical(linea) for linea in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//FaysPy//Agenda//ES', 'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:Agenda FaysPy'))
+
+    for filas in filas_por_lote:
+        eventos = []
+        for id, tarea, tipo, tiempo_empleado, duracion_total, finalizada, fecha_inicio, fecha_final in filas:
+            inicio = fecha_inicio if fecha_inicio and fecha_inicio <= fecha_final else fecha_final
+            nombre = tipos[tipo].nombre if tipo in tipos else tipo
+            eventos += ['BEGIN:VEVENT',
+                        'UID:tarea-{}@{}'.format(id, host),
+                        'DTSTAMP:' + dtstamp,
+                        'DTSTART;VALUE=DATE:' + inicio.strftime('%Y%m%d'),
+                        # DTEND de un evento de día completo es el día siguiente al último
+                        'DTEND;VALUE=DATE:' + (fecha_final + timedelta(days=1)).strftime('%Y%m%d'),
+                        'SUMMARY:' + _texto_ical(tarea + (' (finalizada)' if finalizada else '')),
+                        'DESCRIPTION:' + _texto_ical('Tipo {} ({}). Tiempo empleado: {} de {} h.'.format(
+                            tipo, nombre, tiempo_empleado or 0, duracion_total or 0)),
+                        'CATEGORIES:' + _texto_ical(nombre),
+                        'TRANSP:TRANSPARENT',
+                        'END:VEVENT']
+        yield ''.join(_linea_ical(linea) for linea in eventos)
+
+    yield _linea_ical('END:VCALENDAR')
+
+
+@login_required
+@limited('export')
+def agenda_ics():
+    usuario = current_user.id
+    host = request.host.split(':')[0]
+
+    def generar(filtros, data_updated, batch_size):
+        # DTSTAMP fijo para una misma versión de los datos: el cuerpo coincide con su ETag
+        dtstamp = (data_updated or datetime(1970, 1, 1)).strftime('%Y%m%dT%H%M%SZ')
+        return _ics(_lotes(_consulta(usuario, *filtros, solo_con_fecha=True), batch_size), host, dtstamp)
+
+    return _respuesta('ics', 'text/calendar', generar)
@@ -1,20 +1,26 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, FloatField
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, FloatField, SelectField
 from wtforms.validators import DataRequired, Length, Email, Regexp, EqualTo
 from wtforms.fields.html5 import DateField
 from wtforms import ValidationError
-from ..models import User
+from ..models import User, ClasificadorTareasABC
 from .. import db
 
 class ManagerForm(FlaskForm):
 
     tarea = StringField('Tarea', validators=[DataRequired()])
-    tipo = StringField('Tipo', validators=[DataRequired()])
+    tipo = SelectField('Tipo', validators=[DataRequired()])
     duracion_total = FloatField('Tiempo', validators=[DataRequired()])
     fecha_inicio = DateField('Inicio')
     fecha_final = DateField('Fin')
     submit = SubmitField('Submit')
 
+    def __init__(self, *args, **kwargs):
+        super(ManagerForm, self).__init__(*args, **kwargs)
+        # Opciones (y validación) a partir de los tipos cargados en memoria
+        self.tipo.choices = [(tipo.tipo, 'Tipo {} - {}'.format(tipo.tipo, tipo.nombre))
+                             for tipo in ClasificadorTareasABC.tipos().values()]
+
 class AgendaForm(FlaskForm):
     tiempo_empleado = FloatField('Tiempo empleado')
     finalizada = BooleanField('Finalizada')
@@ -1,22 +1,68 @@
-from flask import render_template, redirect, request, url_for, flash
+import math
+from datetime import date
+from flask import render_template, redirect, request, url_for, flash, current_app, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
-from . import manager_app
 from ..models import User, Task, ClasificadorTareasABC
 from ..email import send_email
-from .. import db
+from .. import db, page_cache, events
 from .forms import *
+from ..exceptions import ValidationError
+from ..decorators import limited
 """
 from .forms import LoginForm, RegistrationForm, ChangePasswordForm, \
     PasswordResetRequestForm, PasswordResetForm, ChangeEmailForm
 """
 
-@manager_app.route('/notebook', methods=['GET', 'POST'])
+def _fragmento():
+    """ True si la petición la hace manager.js y espera solo la tarjeta afectada (HTML o JSON). """
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+def _quiere_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+def _tarea_json(tarea):
+    return {'id': tarea.id,
+            'tarea': tarea.tarea,
+            'tipo': tarea.tipo,
+            'tiempo_empleado': tarea.tiempo_empleado,
+            'duracion_total': tarea.duracion_total,
+            'finalizada': tarea.finalizada,
+            'fecha_inicio': tarea.fecha_inicio.isoformat() if tarea.fecha_inicio else None,
+            'fecha_final': tarea.fecha_final.isoformat() if tarea.fecha_final else None}
+
+def _cambio(*cambios):
+    """
+    Tras el commit de cambios (accion, id) en las tareas del usuario: los publica para sus otras
+    pestañas y devuelve la nueva versión de sus datos (None si nadie la necesita).
+    """
+    if not (events.enabled or _fragmento()):
+        return None
+    version = User.data_version_of(id=current_user.id)[1]
+    for accion, id in cambios:
+        events.publish(current_user.id, accion=accion, id=id, version=version)
+    return version
+
+def _respuesta_tarea(tarea, version=None, status=200):
+    """ Tarjeta de la tarea (o la tarea en JSON) para sustituirla en la página sin recargarla. """
+    if _quiere_json():
+        response = jsonify(tarea=_tarea_json(tarea), version=version)
+    else:
+        response = current_app.make_response(render_template('manager/_tarea.html', tarea=tarea))
+    response.status_code = status
+    if version is not None:
+        response.headers['X-Data-Version'] = str(version)
+    return response
+
+@limited('write', methods=('POST',))
 def notebook():    # Get data from form
     form = ManagerForm()
     # Validate user input
     if form.validate_on_submit(): # forms.py --> ∫validate_email() & validate_username()
         if form.data['fecha_inicio'] > form.data['fecha_final']:
-            flash('Introduce correctamente las fechas de inicio y fin de la actividad')
+            mensaje = 'Introduce correctamente las fechas de inicio y fin de la actividad'
+            if _fragmento():
+                return jsonify(errors={'fecha_final': [mensaje]}), 400
+            flash(mensaje)
         else:
             tarea =  Task(usuario = current_user.id,
                           tarea = form.data['tarea'].title(),
@@ -27,30 +73,91 @@ def notebook():    # Get data from form
                           fecha_inicio = form.data['fecha_inicio'],
                           fecha_final  = form.data['fecha_final'])
             db.session.add(tarea)
+            User.touch_data(current_user.id)
             db.session.commit()
+            version = _cambio(('create', tarea.id))
+            # Desde manager.js: solo la tarjeta de la tarea nueva
+            if _fragmento():
+                return _respuesta_tarea(tarea, version, 201)
             return redirect(url_for('manager_app.notebook'))
+    elif _fragmento() and request.method == 'POST':
+        return jsonify(errors=form.errors), 400
 
     return render_template('manager/notebook.html', form=form)
 
-@manager_app.route('/agenda', methods=['GET', 'POST'])
+@login_required
 def agenda():
     form = AgendaForm()
 
-    # Obtener lista de tareas del usuario de la base de datos
-    tareas = db.session.query(Task).filter_by(usuario=current_user.id).all()
+    # Filtros y tamaño de página
+    limite = request.args.get('limit', current_app.config['AGENDA_PAGE_SIZE'], type=int)
+    limite = max(1, min(limite, current_app.config['AGENDA_PAGE_SIZE_MAX']))
+    estado = request.args.get('estado')
+    finalizada = {'finalizadas': True, 'pendientes': False}.get(estado)
+    tipo = request.args.get('tipo')
+    tipo = tipo if tipo in ClasificadorTareasABC.tipos() else None
+
+    # Vencimiento: tareas pendientes que vencen esta semana o ya vencidas
+    vencimiento = request.args.get('vencimiento')
+    desde = hasta = None
+    if vencimiento == 'semana':
+        desde, hasta = Task.semana()
+        finalizada = False
+    elif vencimiento == 'vencidas':
+        hasta = date.today()
+        finalizada = False
+
+    filtros = {'limit': limite, 'estado': estado, 'tipo': tipo, 'vencimiento': vencimiento}
 
-    return render_template('manager/agenda.html', form=form, lista_tareas=tareas)
+    def render():
+        # Obtener una página de tareas del usuario de la base de datos (solo lectura)
+        tareas, cursor = Task.agenda(current_user.id,
+                                     cursor=request.args.get('cursor'),
+                                     limite=limite,
+                                     finalizada=finalizada,
+                                     tipo=tipo,
+                                     desde=desde,
+                                     hasta=hasta)
+        return render_template('manager/agenda.html', form=form, lista_tareas=tareas, cursor=cursor, filtros=filtros,
+                               data_version=data_version)
 
-@manager_app.route('/agenda/update/id=<id>', methods=['GET','POST'])
+    # Página en caché por usuario, versión de sus datos, filtros y día (los vencimientos dependen de hoy)
+    _, data_version, data_updated, _ = User.data_version_of(id=current_user.id)
+    clave = ('agenda', current_user.id, tuple(sorted(request.args.items(multi=True))), date.today())
+    return page_cache.respond(clave, data_version, data_updated, render, csrf=True)
+
+@login_required
+def history():
+    """ Historial de solo lectura: tareas activas y archivadas del usuario, de la más reciente a la más antigua. """
+    limite = request.args.get('limit', current_app.config['AGENDA_PAGE_SIZE'], type=int)
+    limite = max(1, min(limite, current_app.config['AGENDA_PAGE_SIZE_MAX']))
+    tipo = request.args.get('tipo')
+    tipo = tipo if tipo in ClasificadorTareasABC.tipos() else None
+    filtros = {'limit': limite, 'tipo': tipo}
+
+    def render():
+        filas, cursor = Task.historial(current_user.id, cursor=request.args.get('cursor'), limite=limite, tipo=tipo)
+        return render_template('manager/history.html', filas=filas, cursor=cursor, filtros=filtros)
+
+    _, data_version, data_updated, _ = User.data_version_of(id=current_user.id)
+    clave = ('history', current_user.id, tuple(sorted(request.args.items(multi=True))))
+    return page_cache.respond(clave, data_version, data_updated, render)
+
+@login_required
+@limited('write', methods=('POST',))
 def agenda_update(id):
     form = AgendaForm()
-    # Obtener tarea a actualizar
-    tarea = db.session.query(Task).filter_by(id=id).first()
+    # Obtener tarea a actualizar (solo tareas del usuario)
+    tarea = db.session.query(Task).filter_by(id=id, usuario=current_user.id).first()
 
-    # Obtener lista de tareas del usuario de la base de datos
-    tareas = db.session.query(Task).filter_by(usuario=current_user.id).all()
+    # GET: tarjeta actual de la tarea (manager.js la pide cuando otra pestaña la ha modificado)
+    if request.method == 'GET':
+        if tarea is None:
+            return ('', 404)
+        return _respuesta_tarea(tarea)
 
     # Modificar tarea de la bbdd si se ha producido algún cambio
+    version = None
     if tarea:
         modificada = False
         if tarea.tiempo_empleado != form.data['tiempo_empleado']:
@@ -62,19 +169,108 @@ def agenda_update(id):
             modificada=True
 
         if modificada:
+            User.touch_data(current_user.id)
             db.session.commit()
+            version = _cambio(('update', tarea.id))
 
-
+    if _fragmento():
+        if tarea is None:
+            return ('', 404)
+        return _respuesta_tarea(tarea, version)
 
     return redirect(url_for('manager_app.agenda'))
 
-@manager_app.route('/agenda/delete/id=<id>', methods=['GET','POST'])
+@login_required
+@limited('write')
 def agenda_delete(id):
-    # Eliminar tarea
-    tarea = db.session.query(Task).filter_by(id=int(id)).delete()
+    # Eliminar tarea (solo tareas del usuario)
+    eliminadas = db.session.query(Task).filter_by(id=int(id), usuario=current_user.id).delete()
 
     # Ejecutar operaciones sobre la bbdd
+    if eliminadas:
+        User.touch_data(current_user.id)
     db.session.commit()
 
+    version = _cambio(('delete', int(id))) if eliminadas else None
+    if _fragmento():
+        if not eliminadas:
+            return ('', 404)
+        response = current_app.make_response(('', 204))
+        response.headers['X-Data-Version'] = str(version)
+        return response
+
     return redirect(url_for('manager_app.agenda'))
 
+def _parse_lote(datos):
+    """
+    Valida el cuerpo JSON de /agenda/batch:
+        {"updates": [{"id": 1, "tiempo_empleado": 2.5, "finalizada": true}, ...], "deletes": [3, 4]}
+
+    Cada actualización escribe las dos columnas: tiempo_empleado (número) y finalizada (booleano JSON)
+    son obligatorios, para que una actualización incompleta no borre el valor que falta.
+    """
+    if not isinstance(datos, dict):
+        raise ValidationError('Se esperaba un objeto JSON con "updates" y/o "deletes"')
+
+    cambios = []
+    for cambio in datos.get('updates') or []:
+        if not isinstance(cambio, dict):
+            raise ValidationError('Actualización no válida: {!r}'.format(cambio))
+        id, tiempo_empleado, finalizada = cambio.get('id'), cambio.get('tiempo_empleado'), cambio.get('finalizada')
+        if not isinstance(id, int) or isinstance(id, bool):
+            raise ValidationError('"id" debe ser un entero: {!r}'.format(cambio))
+        if not isinstance(tiempo_empleado, (int, float)) or isinstance(tiempo_empleado, bool) \
+                or not math.isfinite(tiempo_empleado):
+            raise ValidationError('"tiempo_empleado" debe ser un número: {!r}'.format(cambio))
+        if not isinstance(finalizada, bool):
+            raise ValidationError('"finalizada" debe ser true o false: {!r}'.format(cambio))
+        cambios.append({'id': id, 'tiempo_empleado': float(tiempo_empleado), 'finalizada': finalizada})
+
+    eliminadas = datos.get('deletes') or []
+    if not isinstance(eliminadas, list) or \
+            not all(isinstance(id, int) and not isinstance(id, bool) for id in eliminadas):
+        raise ValidationError('"deletes" debe ser una lista de ids enteros')
+
+    limite = current_app.config['AGENDA_BATCH_MAX']
+    if len(cambios) + len(eliminadas) > limite:
+        raise ValidationError('Como máximo {} operaciones por lote'.format(limite))
+
+    return cambios, eliminadas
+
+@login_required
+@limited('write')
+def agenda_batch():
+    """ Aplica varias actualizaciones y eliminaciones de tareas del usuario en una sola transacción. """
+    if not request.is_json:
+        return jsonify(error='Se esperaba application/json'), 415
+
+    try:
+        cambios, eliminadas = _parse_lote(request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify(error=str(e)), 400
+
+    actualizadas = Task.actualizar_lote(current_user.id, cambios)
+    borradas = Task.eliminar_lote(current_user.id, eliminadas)
+    if actualizadas or borradas:
+        User.touch_data(current_user.id)
+    db.session.commit()
+
+    version = None
+    if actualizadas or borradas:
+        version = _cambio(*([('update', cambio['id']) for cambio in cambios] +
+                            [('delete', id) for id in eliminadas]))
+
+    return jsonify(updated=actualizadas, deleted=borradas, version=version)
+
+@login_required
+def agenda_events():
+    """ Server-Sent Events con los cambios en las tareas del usuario (ver app/events.py). """
+    if not events.enabled:
+        return ('', 404)
+    version = request.args.get('version', type=int)
+    if version is None:
+        version = User.data_version_of(id=current_user.id)[1]
+    response = current_app.response_class(events.stream(current_user.id, version), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Sin buffer en nginx
+    return response
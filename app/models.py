@@ -1,10 +1,16 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
+import base64
 import hashlib
-from werkzeug.security import generate_password_hash, check_password_hash
+import json
+import re
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+from sqlalchemy import DDL, event, table, column, literal_column, func, select, union_all, null, type_coerce
+from sqlalchemy.orm import joinedload, make_transient_to_detached
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
-from flask import current_app
+from flask import current_app, url_for
 from flask_login import UserMixin, AnonymousUserMixin
-from . import login_manager
+from . import login_manager, identity_cache, last_seen_buffer, password_hasher, avatar_cache
 from . import db
 
 class Permission:
@@ -49,6 +55,9 @@ class Role(db.Base):
 
         db.session.commit()
 
+        # Los permisos de los usuarios en caché pueden haber cambiado
+        identity_cache.clear()
+
     def add_permission(self, perm):
         if not self.has_permission(perm):
             self.permissions += perm
@@ -79,6 +88,9 @@ class User(db.Base, UserMixin):
     member_since = db.Column(db.DateTime(), default=datetime.utcnow())
     last_seen = db.Column(db.DateTime(), default=datetime.utcnow())
     avatar_hash = db.Column(db.String(32))
+    # Versión de los datos del usuario (perfil y tareas) para la caché de páginas y los ETag
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    data_updated = db.Column(db.DateTime())
 
     def __init__(self, **kwargs):
         """ Esta tabla y sus funciones proporcionarán la asignación de permisos que necesitamos para
@@ -102,10 +114,14 @@ class User(db.Base, UserMixin):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """ True si el hash de la contraseña no usa los parámetros de coste actuales. """
+        return password_hasher.needs_rehash(self.password_hash)
 
     def generate_confirmation_token(self, expiration=3600):
         s = Serializer(current_app.config['SECRET_KEY'], expiration)
@@ -143,6 +159,7 @@ class User(db.Base, UserMixin):
             return False
         user.password = new_password
         db.session.add(user)
+        identity_cache.invalidate(user.id)
         return True
 
     def generate_email_change_token(self, new_email, expiraiton=3600):
@@ -167,30 +184,73 @@ class User(db.Base, UserMixin):
         self.email = new_email
         self.avatar_hash = self.gravatar_hash()
         db.session.add(self)
+        identity_cache.invalidate(self.id)
 
         return True
 
     def can(self, perm):
-        return self.role is not None and self.role.has_permission(perm)
+        permisos = self.permisos
+        return permisos is not None and permisos & perm == perm
+
+    @property
+    def permisos(self):
+        """ Máscara de permisos del rol (precalculada si el usuario viene de la caché de identidad). """
+        if '_permisos' not in self.__dict__:
+            self._permisos = self.role.permissions if self.role is not None else None
+        return self._permisos
+
+    def to_identity(self):
+        """ Copia de las columnas del usuario y su máscara de permisos para la caché de identidad. """
+        datos = {column.key: getattr(self, column.key) for column in User.__table__.columns}
+        datos['_permisos'] = self.permisos
+        return datos
+
+    @staticmethod
+    def from_identity(datos):
+        """
+        Reconstruye un usuario desvinculado (detached) a partir de la caché de identidad, sin consultar
+        la bbdd. Los cambios que se hagan sobre él se guardan al añadirlo a la sesión (db.session.add).
+        """
+        user = User.__mapper__.class_manager.new_instance()
+        for key, value in datos.items():
+            setattr(user, key, value)
+        make_transient_to_detached(user)
+        return user
 
     def is_administrator(self):
         return self.can(Permission.ADMIN)
 
+    @staticmethod
+    def touch_data(user_id):
+        """
+        Incrementa la versión de los datos del usuario en la transacción de db.session (sin commit), de
+        modo que sus páginas en caché dejan de ser válidas. Se llama desde las vistas que los modifican.
+        """
+        users = User.__table__
+        db.session.execute(users.update().where(users.c.id == user_id)
+                           .values(data_version=users.c.data_version + 1, data_updated=datetime.utcnow()))
+
+    @staticmethod
+    def data_version_of(**filtros):
+        """
+        (id, data_version, data_updated, last_seen) del usuario que cumple `filtros`, o None. Se lee de la
+        bbdd principal para ver siempre la última escritura del propio usuario.
+        """
+        return db.session.query(User.id, User.data_version, User.data_updated, User.last_seen) \
+            .filter_by(**filtros).first()
+
     def ping(self):
-        self.last_seen = datetime.utcnow()
-        db.session.add(self)
+        # La hora se escribe en bbdd agrupada con la de otros usuarios (ver app/last_seen.py)
+        last_seen_buffer.touch(self.id)
 
     def gravatar_hash(self):
         return hashlib.md5(self.email.lower().encode('utf-8')).hexdigest()
 
-    def gravatar(self, size=100, default='identicon', rating='g'):
-        url = 'https://secure.gravatar.com/avatar'
+    def gravatar(self, size=100):
+        """ URL del avatar del usuario, generado por la propia aplicación (ver app/avatars.py). """
         hash = self.avatar_hash or self.gravatar_hash()
-        return '{url}/{hash}?s={size}&d={default}&r={rating}'.format(url=url,
-                                                                     hash=hash,
-                                                                     size=size,
-                                                                     default=default,
-                                                                     rating=rating)
+        size = max(avatar_cache.min_size, min(size, avatar_cache.max_size))
+        return url_for('main.avatar', hash=hash, size=size)
 
     def __repr__(self):
         return '<User %r>' % self.username
@@ -212,7 +272,18 @@ login_manager.anonymous_user = AnonymousUser
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.query(User).get(int(user_id))
+    user_id = int(user_id)
+    datos = identity_cache.get(user_id)
+    if datos is not None:
+        return User.from_identity(datos)
+
+    # Consulta de solo lectura: el rol se carga en la misma consulta para que User.can() no dependa
+    # de la sesión de lectura una vez desvinculado el usuario.
+    user = db.read_session.query(User).options(joinedload(User.role)).get(user_id)
+    if user is not None:
+        db.detach(user, user.role)
+        identity_cache.set(user_id, user.to_identity())
+    return user
 
 class ClasificadorTareasABC(db.Base):
     """
@@ -243,12 +314,33 @@ class ClasificadorTareasABC(db.Base):
     __tablename__ = 'clasificador_tareas'
     id = db.Column(db.Integer, primary_key=True)
     tipo = db.Column(db.String(10))
+    nombre = db.Column(db.String(64))
     descripcion = db.Column(db.Text, nullable=False)
     ponderacion = db.Column(db.Integer, default=10)
 
+    # Tipos de tarea cargados en memoria: {tipo: TipoTarea}, de solo lectura (ver load y tipos)
+    _tipos = MappingProxyType({})
+
     def __init__(self, **kwargs):
         super(ClasificadorTareasABC, self).__init__(**kwargs)
 
+    @staticmethod
+    def load():
+        """
+        Carga el clasificador de la bbdd en un mapa inmutable del proceso. Se llama al crear la aplicación
+        y desde insert_clasificador; el resto del tiempo los tipos se leen sin consultar la bbdd.
+        """
+        filas = db.session.query(ClasificadorTareasABC).order_by(ClasificadorTareasABC.tipo).all()
+        ClasificadorTareasABC._tipos = MappingProxyType(OrderedDict(
+            (fila.tipo, TipoTarea(fila.tipo, fila.nombre or fila.tipo, fila.descripcion, fila.ponderacion or 0))
+            for fila in filas))
+        return ClasificadorTareasABC._tipos
+
+    @staticmethod
+    def tipos():
+        """ Mapa inmutable {tipo: TipoTarea(tipo, nombre, descripcion, ponderacion)}, ordenado por tipo. """
+        return ClasificadorTareasABC._tipos
+
     @staticmethod
     def insert_clasificador():
         clasificacion_tareas = {
@@ -275,12 +367,19 @@ class ClasificadorTareasABC(db.Base):
             tarea = db.session.query(ClasificadorTareasABC).filter_by(tipo=ct).first()
             if tarea is None:
                 # Añadir tarea completa a la base de datos.
-                tarea = ClasificadorTareasABC(tipo=ct,
-                                              descripcion=clasificacion_tareas[ct][1],
-                                              ponderacion=clasificacion_tareas[ct][2])
+                tarea = ClasificadorTareasABC(tipo=ct)
                 db.session.add(tarea)
+            tarea.nombre = clasificacion_tareas[ct][0]
+            tarea.descripcion = clasificacion_tareas[ct][1]
+            tarea.ponderacion = clasificacion_tareas[ct][2]
         db.session.commit()
 
+        # Recargar el mapa de tipos del proceso
+        ClasificadorTareasABC.load()
+
+# Tipo de tarea del clasificador ABC tal como se guarda en memoria
+TipoTarea = namedtuple('TipoTarea', 'tipo nombre descripcion ponderacion')
+
 # Modelos de aplicaciones python en web
 class Task(db.Base, UserMixin):
     """
@@ -289,6 +388,14 @@ class Task(db.Base, UserMixin):
     Actualización 1 (no realizada): Añadir tipo de tarea como tabla en la bbdd
     """
     __tablename__ = "manager"
+    __table_args__ = (
+        # Índices de la agenda paginada por (usuario, fecha_final, id), con y sin filtros.
+        db.Index('ix_manager_usuario_fecha_final_id', 'usuario', 'fecha_final', 'id'),
+        db.Index('ix_manager_usuario_finalizada_fecha_final_id', 'usuario', 'finalizada', 'fecha_final', 'id'),
+        db.Index('ix_manager_usuario_tipo_fecha_final_id', 'usuario', 'tipo', 'fecha_final', 'id'),
+        # Los ids no se reutilizan: las tareas archivadas (TaskArchive) conservan el suyo
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     usuario = db.Column(db.Integer, db.ForeignKey('users.id')) # Id del usuario (tabla users)
     tarea = db.Column(db.String(20), nullable=False)
@@ -296,12 +403,204 @@ class Task(db.Base, UserMixin):
     tiempo_empleado = db.Column(db.Float)  # Tiempo dedicado a la tarea (Floatante)
     duracion_total = db.Column(db.Float)   # Duración en horas total de la tarea (Floatante)
     finalizada = db.Column(db.Boolean)     # Booleano que indica si la tarea ha sido realizada o no
-    fecha_inicio = db.Column(db.String()) # Fecha de inicio
-    fecha_final  = db.Column(db.String()) # Fecha final prevista (deadline).
+    fecha_inicio = db.Column(db.Date) # Fecha de inicio
+    fecha_final  = db.Column(db.Date) # Fecha final prevista (deadline).
 
     def __init__(self, **kwargs):
         super(Task, self).__init__(**kwargs)
 
+    @staticmethod
+    def encode_cursor(fecha_final, id):
+        """ Cursor opaco con la posición (fecha_final, id) de la última tarea de una página. """
+        fecha_final = fecha_final.isoformat() if fecha_final else None
+        posicion = json.dumps([fecha_final, id])
+        return base64.urlsafe_b64encode(posicion.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """ Devuelve (fecha_final, id) o None si el cursor no es válido. """
+        try:
+            fecha_final, id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            return (date.fromisoformat(fecha_final) if fecha_final else None), int(id)
+        except (ValueError, TypeError, UnicodeError):
+            return None
+
+    @staticmethod
+    def agenda(usuario, cursor=None, limite=30, finalizada=None, tipo=None, desde=None, hasta=None):
+        """
+        Página de la agenda de un usuario ordenada por (fecha_final, id) con paginación por clave
+        (keyset): cada página es un recorrido de rango sobre los índices de la tabla, sin OFFSET.
+        `desde` y `hasta` limitan la fecha final (intervalo [desde, hasta)).
+
+        Devuelve (tareas, cursor_siguiente). cursor_siguiente es None en la última página.
+        """
+        query = Task.por_fecha_final(usuario, desde, hasta)
+        if finalizada is not None:
+            query = query.filter(Task.finalizada == finalizada)
+        if tipo is not None:
+            query = query.filter(Task.tipo == tipo)
+
+        tareas = Task.despues_de(query, cursor).order_by(Task.fecha_final, Task.id).limit(limite + 1).all()
+        if len(tareas) > limite:
+            tareas = tareas[:limite]
+            return tareas, Task.encode_cursor(tareas[-1].fecha_final, tareas[-1].id)
+        return tareas, None
+
+    @staticmethod
+    def despues_de(query, cursor):
+        """ Filtra `query` (ordenada por fecha_final, id) para continuar después de `cursor`. """
+        posicion = Task.decode_cursor(cursor) if cursor else None
+        if posicion is None:
+            return query
+
+        fecha_final, id = posicion
+        if fecha_final is None:
+            # Las fechas nulas van primero en el orden ascendente (SQLite)
+            return query.filter(db.or_(Task.fecha_final.isnot(None),
+                                       db.and_(Task.fecha_final.is_(None), Task.id > id)))
+        return query.filter(db.or_(Task.fecha_final > fecha_final,
+                                   db.and_(Task.fecha_final == fecha_final, Task.id > id)))
+
+    @staticmethod
+    def actualizar_lote(usuario, cambios):
+        """
+        Actualiza tiempo_empleado y finalizada de varias tareas del usuario con un único UPDATE
+        ejecutado como executemany. `cambios` es una lista de dicts con id, tiempo_empleado y
+        finalizada. No hace commit. Devuelve el número de filas actualizadas.
+        """
+        if not cambios:
+            return 0
+        tabla = Task.__table__
+        update = tabla.update() \
+            .where(db.and_(tabla.c.id == db.bindparam('b_id'), tabla.c.usuario == db.bindparam('b_usuario'))) \
+            .values(tiempo_empleado=db.bindparam('b_tiempo_empleado'), finalizada=db.bindparam('b_finalizada'))
+        resultado = db.session.execute(update, [{'b_id': cambio['id'],
+                                                 'b_usuario': usuario,
+                                                 'b_tiempo_empleado': cambio['tiempo_empleado'],
+                                                 'b_finalizada': cambio['finalizada']} for cambio in cambios])
+        return resultado.rowcount
+
+    @staticmethod
+    def eliminar_lote(usuario, ids):
+        """ Elimina varias tareas del usuario con un único DELETE. No hace commit. """
+        if not ids:
+            return 0
+        tabla = Task.__table__
+        resultado = db.session.execute(tabla.delete().where(db.and_(tabla.c.usuario == usuario,
+                                                                     tabla.c.id.in_(ids))))
+        return resultado.rowcount
+
+    @staticmethod
+    def por_fecha_final(usuario, desde=None, hasta=None):
+        """ Tareas del usuario con fecha final en [desde, hasta) (rango sobre el índice de la agenda). """
+        query = db.read_session.query(Task).filter(Task.usuario == usuario)
+        if desde is not None:
+            query = query.filter(Task.fecha_final >= desde)
+        if hasta is not None:
+            query = query.filter(Task.fecha_final < hasta)
+        return query
+
+    @staticmethod
+    def semana(hoy=None):
+        """ Intervalo [lunes, lunes siguiente) de la semana de `hoy`. """
+        hoy = hoy or date.today()
+        lunes = hoy - timedelta(days=hoy.weekday())
+        return lunes, lunes + timedelta(days=7)
+
+    @staticmethod
+    def vencen_esta_semana(usuario, hoy=None):
+        """ Tareas sin finalizar cuya fecha final cae en la semana actual. """
+        desde, hasta = Task.semana(hoy)
+        return Task.por_fecha_final(usuario, desde, hasta).filter(Task.finalizada == False) \
+            .order_by(Task.fecha_final, Task.id)
+
+    @staticmethod
+    def vencidas(usuario, hoy=None):
+        """ Tareas sin finalizar cuya fecha final ya ha pasado. """
+        return Task.por_fecha_final(usuario, hasta=hoy or date.today()).filter(Task.finalizada == False) \
+            .order_by(Task.fecha_final, Task.id)
+
+    # Índice de búsqueda de texto (tabla FTS5 task_search, ver TASK_SEARCH_DDL)
+    _busqueda_fts = False
+
+    @staticmethod
+    def motor_busqueda():
+        """ 'fts5' si la bbdd tiene el índice task_search y 'like' si no (otros motores, o sin migrar). """
+        if not Task._busqueda_fts and db.read_engine.dialect.name == 'sqlite':
+            # Solo se recuerda cuando existe: una migración o `flask rebuild-task-search` lo pueden crear después
+            Task._busqueda_fts = db.read_engine.has_table('task_search')
+        return 'fts5' if Task._busqueda_fts else 'like'
+
+    @staticmethod
+    def buscar(usuario, texto, tipo=None, finalizada=None, limite=20):
+        """
+        Tareas del usuario cuyo texto contiene todas las palabras de `texto` (o palabras que empiezan por
+        ellas), ordenadas por relevancia (bm25). Sin el índice FTS5 se buscan con LIKE entre las tareas
+        del usuario, ordenadas por fecha final. Devuelve una lista de Task.
+        """
+        palabras = re.findall(r'\w+', texto or '')[:BUSQUEDA_PALABRAS_MAX]
+        if not palabras:
+            return []
+
+        query = db.read_session.query(Task).filter(Task.usuario == usuario)
+        if tipo is not None:
+            query = query.filter(Task.tipo == tipo)
+        if finalizada is not None:
+            query = query.filter(Task.finalizada == finalizada)
+
+        if Task.motor_busqueda() == 'fts5':
+            # Cada palabra entre comillas (sin operadores de FTS5) y con * para buscar por prefijo
+            consulta = ' '.join('"{}"*'.format(palabra) for palabra in palabras)
+            indice = table('task_search', column('rowid'))
+            query = query.join(indice, indice.c.rowid == Task.id) \
+                .filter(literal_column('task_search').match(consulta)) \
+                .order_by(func.bm25(literal_column('task_search')), Task.id)
+        else:
+            for palabra in palabras:
+                query = query.filter(Task.tarea.ilike('%{}%'.format(palabra.replace('_', '\\_')), escape='\\'))
+            query = query.order_by(Task.fecha_final, Task.id)
+        return query.limit(limite).all()
+
+    @staticmethod
+    def historial(usuario, cursor=None, limite=30, tipo=None):
+        """
+        Página del historial del usuario: sus tareas activas y las archivadas (TaskArchive) juntas, de la
+        fecha final más reciente a la más antigua, con paginación por clave como la agenda. Es de solo
+        lectura: las filas son tuplas con las columnas de TaskArchive (archivada es None en las activas).
+
+        Cada tabla se lee con su índice (usuario, fecha_final, id) y como mucho limite + 1 filas, y se
+        mezclan después. Devuelve (filas, cursor_siguiente).
+        """
+        posicion = Task.decode_cursor(cursor) if cursor else None
+        consultas = []
+        for tabla in (Task.__table__, TaskArchive.__table__):
+            archivada = tabla.c.archivada if 'archivada' in tabla.c else type_coerce(null(), db.DateTime)
+            consulta = select([tabla.c[columna] for columna in TASK_HISTORY_COLUMNS] +
+                                 [archivada.label('archivada')]).where(tabla.c.usuario == usuario)
+            if tipo is not None:
+                consulta = consulta.where(tabla.c.tipo == tipo)
+            if posicion is not None:
+                fecha_final, id = posicion
+                # Orden descendente: las fechas nulas van al final (SQLite)
+                if fecha_final is None:
+                    consulta = consulta.where(db.and_(tabla.c.fecha_final.is_(None), tabla.c.id < id))
+                else:
+                    consulta = consulta.where(db.or_(tabla.c.fecha_final < fecha_final,
+                                                     db.and_(tabla.c.fecha_final == fecha_final, tabla.c.id < id),
+                                                     tabla.c.fecha_final.is_(None)))
+            consulta = consulta.order_by(tabla.c.fecha_final.desc(), tabla.c.id.desc()).limit(limite + 1)
+            # SQLite no admite ORDER BY ni LIMIT en cada parte de un UNION: cada una va en una subconsulta
+            consultas.append(select([consulta.alias()]))
+
+        historial = union_all(*consultas).alias('historial')
+        filas = db.read_session.execute(select([historial])
+                                        .order_by(historial.c.fecha_final.desc(), historial.c.id.desc())
+                                        .limit(limite + 1)).fetchall()
+        if len(filas) > limite:
+            filas = filas[:limite]
+            return filas, Task.encode_cursor(filas[-1].fecha_final, filas[-1].id)
+        return filas, None
+
     def __repr__(self):
         return "Tarea: {}. Usuario: {}. Descripcion: {}. Clasificacion: {}. Tiempo_empleado: {} horas. " \
                "Duracion: {} horas. Finalizada: {}. Fecha Inicio: {}. Fecha final: {}".format(self.id,
@@ -327,4 +626,178 @@ class Task(db.Base, UserMixin):
                                                                                               self.fecha_final)
 
 
+class TaskSummary(db.Base):
+    """
+    Resumen de las tareas de cada usuario por tipo ABC: número de tareas, finalizadas y horas empleadas
+    y previstas. Lo mantienen al día los triggers de TASK_SUMMARY_TRIGGERS en cada INSERT, UPDATE y DELETE
+    de la tabla manager (también los masivos), de modo que leer el resumen de un usuario no depende del
+    número de tareas. `flask rebuild-task-summary` lo recalcula desde cero.
+    """
+    __tablename__ = 'task_summary'
+    usuario = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    tipo = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    finalizadas = db.Column(db.Integer, nullable=False, default=0)
+    tiempo_empleado = db.Column(db.Float, nullable=False, default=0)
+    duracion_total = db.Column(db.Float, nullable=False, default=0)
+
+    @staticmethod
+    def resumen(usuario):
+        """
+        Carga de trabajo del usuario por tipo, con la ponderación ABC del clasificador:
+            {'tipos': {'A': {...}, ...}, 'carga_ponderada': ..., 'tasa_finalizacion': ...}
+        La carga ponderada suma, para cada tipo, las horas pendientes (previstas - empleadas) por su ponderación.
+        """
+        filas = db.read_session.query(TaskSummary).filter(TaskSummary.usuario == usuario) \
+            .order_by(TaskSummary.tipo).all()
+
+        tipos = {}
+        carga = total = finalizadas = 0
+        for fila in filas:
+            tipo = ClasificadorTareasABC.tipos().get(fila.tipo)
+            ponderacion = tipo.ponderacion if tipo else 0
+            pendiente = max(fila.duracion_total - fila.tiempo_empleado, 0)
+            tipos[fila.tipo] = {'total': fila.total,
+                                'finalizadas': fila.finalizadas,
+                                'tasa_finalizacion': fila.finalizadas / fila.total if fila.total else 0,
+                                'tiempo_empleado': fila.tiempo_empleado,
+                                'duracion_total': fila.duracion_total,
+                                'ponderacion': ponderacion,
+                                'carga_ponderada': pendiente * ponderacion / 100}
+            carga += tipos[fila.tipo]['carga_ponderada']
+            total += fila.total
+            finalizadas += fila.finalizadas
+
+        return {'tipos': tipos,
+                'total': total,
+                'finalizadas': finalizadas,
+                'tasa_finalizacion': finalizadas / total if total else 0,
+                'carga_ponderada': carga}
+
+    def __repr__(self):
+        return '<TaskSummary {} {}: {} tareas>'.format(self.usuario, self.tipo, self.total)
+
+
+def _sumar(fila, signo):
+    """ Cuerpo de trigger que suma (signo '+') o resta ('-') la fila NEW/OLD de la tabla manager. """
+    return """
+        INSERT OR IGNORE INTO task_summary (usuario, tipo, total, finalizadas, tiempo_empleado, duracion_total)
+            SELECT {f}.usuario, {f}.tipo, 0, 0, 0, 0 WHERE {f}.usuario IS NOT NULL;
+        UPDATE task_summary
+            SET total = total {s} 1,
+                finalizadas = finalizadas {s} (CASE WHEN {f}.finalizada THEN 1 ELSE 0 END),
+                tiempo_empleado = tiempo_empleado {s} COALESCE({f}.tiempo_empleado, 0),
+                duracion_total = duracion_total {s} COALESCE({f}.duracion_total, 0)
+            WHERE usuario = {f}.usuario AND tipo = {f}.tipo;
+        DELETE FROM task_summary WHERE usuario = {f}.usuario AND tipo = {f}.tipo AND total <= 0;""" \
+        .format(f=fila, s=signo)
+
+
+# Triggers de SQLite que mantienen task_summary. En otros motores el resumen se recalcula con
+# `flask rebuild-task-summary`.
+TASK_SUMMARY_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS task_summary_insert AFTER INSERT ON manager BEGIN{} END'
+    .format(_sumar('NEW', '+')),
+    'CREATE TRIGGER IF NOT EXISTS task_summary_delete AFTER DELETE ON manager BEGIN{} END'
+    .format(_sumar('OLD', '-')),
+    'CREATE TRIGGER IF NOT EXISTS task_summary_update '
+    'AFTER UPDATE OF usuario, tipo, finalizada, tiempo_empleado, duracion_total ON manager BEGIN{}{} END'
+    .format(_sumar('OLD', '-'), _sumar('NEW', '+')),
+)
+
+for trigger in TASK_SUMMARY_TRIGGERS:
+    event.listen(db.metadata, 'after_create', DDL(trigger).execute_if(dialect='sqlite'))
+
+# Palabras de una búsqueda que se tienen en cuenta (ver Task.buscar)
+BUSQUEDA_PALABRAS_MAX = 8
+
+# Índice de búsqueda de texto de las tareas en SQLite: tabla FTS5 con el contenido externo de la tabla
+# manager (solo guarda el índice, no una copia del texto), sin distinguir mayúsculas ni acentos y con
+# índices de prefijo de 2 y 3 caracteres. Lo mantienen los triggers en cada INSERT, UPDATE y DELETE;
+# `flask rebuild-task-search` lo reconstruye desde la tabla manager.
+TASK_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5(tarea, content='manager', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 1', prefix='2 3')",
+    'CREATE TRIGGER IF NOT EXISTS task_search_insert AFTER INSERT ON manager BEGIN '
+    'INSERT INTO task_search (rowid, tarea) VALUES (NEW.id, NEW.tarea); END',
+    'CREATE TRIGGER IF NOT EXISTS task_search_delete AFTER DELETE ON manager BEGIN '
+    "INSERT INTO task_search (task_search, rowid, tarea) VALUES ('delete', OLD.id, OLD.tarea); END",
+    'CREATE TRIGGER IF NOT EXISTS task_search_update AFTER UPDATE OF tarea ON manager BEGIN '
+    "INSERT INTO task_search (task_search, rowid, tarea) VALUES ('delete', OLD.id, OLD.tarea); "
+    'INSERT INTO task_search (rowid, tarea) VALUES (NEW.id, NEW.tarea); END',
+)
+
+for ddl in TASK_SEARCH_DDL:
+    event.listen(db.metadata, 'after_create', DDL(ddl).execute_if(dialect='sqlite'))
+
+
+class TaskArchive(db.Base):
+    """
+    Tareas finalizadas archivadas: `flask archive-tasks` mueve aquí por lotes las que terminaron hace más
+    de ARCHIVE_AFTER_DAYS días, de modo que la tabla manager (y sus índices) solo contiene las tareas con
+    las que se trabaja. Conservan su id y se leen con Task.historial; no se modifican.
+    """
+    __tablename__ = 'manager_archive'
+    __table_args__ = (
+        db.Index('ix_manager_archive_usuario_fecha_final_id', 'usuario', 'fecha_final', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Id de la tarea en la tabla manager
+    usuario = db.Column(db.Integer, db.ForeignKey('users.id'))
+    tarea = db.Column(db.String(20), nullable=False)
+    tipo = db.Column(db.String(20), db.ForeignKey('clasificador_tareas.tipo'), nullable=False)
+    tiempo_empleado = db.Column(db.Float)
+    duracion_total = db.Column(db.Float)
+    finalizada = db.Column(db.Boolean)
+    fecha_inicio = db.Column(db.Date)
+    fecha_final = db.Column(db.Date)
+    archivada = db.Column(db.DateTime, default=datetime.utcnow)  # Fecha en que se archivó
+
+    def __repr__(self):
+        return '<TaskArchive {}: {}>'.format(self.id, self.tarea)
+
+
+# Columnas comunes de manager y manager_archive (historial y archivado)
+TASK_HISTORY_COLUMNS = ('id', 'usuario', 'tarea', 'tipo', 'tiempo_empleado', 'duracion_total', 'finalizada',
+                        'fecha_inicio', 'fecha_final')
+
+# Las tareas archivadas siguen contando en task_summary: al archivar, el trigger de DELETE de manager resta
+# la tarea y el de INSERT de manager_archive la vuelve a sumar.
+TASK_ARCHIVE_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS task_archive_summary_insert AFTER INSERT ON manager_archive BEGIN{} END'
+    .format(_sumar('NEW', '+')),
+    'CREATE TRIGGER IF NOT EXISTS task_archive_summary_delete AFTER DELETE ON manager_archive BEGIN{} END'
+    .format(_sumar('OLD', '-')),
+)
 
+for trigger in TASK_ARCHIVE_TRIGGERS:
+    event.listen(db.metadata, 'after_create', DDL(trigger).execute_if(dialect='sqlite'))
+
+
+class EmailOutbox(db.Base):
+    """
+    Bandeja de salida de emails. send_email() guarda aquí cada mensaje y los workers de app/outbox.py
+    los envían por lotes reutilizando la conexión SMTP y reintentando con espera exponencial.
+
+    Estados: pending -> sending -> sent, o failed tras OUTBOX_MAX_ATTEMPTS intentos.
+    """
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(128))
+    recipients = db.Column(db.Text, nullable=False)  # Destinatarios separados por comas
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    claimed_by = db.Column(db.String(32))  # Worker que está enviando el mensaje
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '<EmailOutbox {} {} {}>'.format(self.id, self.status, self.subject)
@@ -0,0 +1,291 @@
+"""
+Bandeja de salida de emails con un pool fijo de workers de envío.
+
+send_email() solo guarda el mensaje en la tabla email_outbox. OUTBOX_WORKERS hilos reclaman los
+mensajes pendientes por lotes de OUTBOX_BATCH_SIZE y los envían reutilizando una misma conexión SMTP
+mientras haya trabajo. Un envío fallido se reintenta con espera exponencial (OUTBOX_BACKOFF * 2^n
+segundos) hasta OUTBOX_MAX_ATTEMPTS intentos; después queda como 'failed'. Los mensajes reclamados por
+un worker que muere se vuelven a reclamar pasados OUTBOX_CLAIM_TIMEOUT segundos. Los enviados se
+borran pasados OUTBOX_RETENTION_DAYS días (cada worker lo comprueba cada OUTBOX_PURGE_INTERVAL segundos).
+
+Para probarlo en local basta un servidor SMTP de pruebas, por ejemplo:
+
+    python -m aiosmtpd -n -l localhost:1025
+
+con MAIL_SERVER=localhost y MAIL_PORT=1025.
+"""
+
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from flask_mail import Message
+from sqlalchemy import Table, MetaData, Column, select, func, and_, or_, bindparam, Integer, String, Text, DateTime
+from . import db
+
+logger = logging.getLogger(__name__)
+
+# Intentos de registrar en la bbdd el resultado de un lote ya enviado
+REGISTRO_INTENTOS = 3
+
+# Columnas de models.EmailOutbox (en su propio MetaData: importar el modelo crearía una importación circular)
+outbox_table = Table('email_outbox', MetaData(),
+                     Column('id', Integer, primary_key=True), Column('sender', String), Column('recipients', Text),
+                     Column('subject', String), Column('body', Text), Column('html', Text),
+                     Column('status', String), Column('attempts', Integer), Column('last_error', Text),
+                     Column('claimed_by', String), Column('claimed_at', DateTime), Column('created_at', DateTime),
+                     Column('next_attempt_at', DateTime), Column('sent_at', DateTime))
+
+# Envío fallido: vuelve a 'pending' con el siguiente reintento programado (o queda 'failed')
+reintento = outbox_table.update().where(outbox_table.c.id == bindparam('b_id')) \
+    .values(status=bindparam('b_status'), attempts=bindparam('b_attempts'),
+            next_attempt_at=bindparam('b_next_attempt_at'), last_error=bindparam('b_last_error'),
+            claimed_by=None, claimed_at=None)
+
+
+class Outbox(object):
+
+    def __init__(self, workers=2, batch_size=20, max_attempts=5, backoff=30, poll_interval=5, claim_timeout=300,
+                 retention_days=7, purge_interval=3600):
+        self.app = None
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self.sent = 0
+        self.failed = 0
+        self._latencies = deque(maxlen=1000)  # Segundos desde que se encoló hasta que se envió
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._threads = []
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('OUTBOX_WORKERS', self.workers)
+        self.batch_size = app.config.get('OUTBOX_BATCH_SIZE', self.batch_size)
+        self.max_attempts = app.config.get('OUTBOX_MAX_ATTEMPTS', self.max_attempts)
+        self.backoff = app.config.get('OUTBOX_BACKOFF', self.backoff)
+        self.poll_interval = app.config.get('OUTBOX_POLL_INTERVAL', self.poll_interval)
+        self.claim_timeout = app.config.get('OUTBOX_CLAIM_TIMEOUT', self.claim_timeout)
+        self.retention_days = app.config.get('OUTBOX_RETENTION_DAYS', self.retention_days)
+        self.purge_interval = app.config.get('OUTBOX_PURGE_INTERVAL', self.purge_interval)
+
+    def enqueue(self, connection, recipients, subject, body=None, html=None, sender=None):
+        """
+        Inserta un mensaje pendiente con `connection`; queda guardado cuando se confirme la transacción
+        de esa conexión. Devuelve su id.
+        """
+        ahora = datetime.utcnow()
+        result = connection.execute(outbox_table.insert().values(
+            sender=sender, recipients=','.join(recipients), subject=subject, body=body, html=html,
+            status='pending', attempts=0, created_at=ahora, next_attempt_at=ahora))
+        return result.inserted_primary_key[0]
+
+    def notify(self):
+        """ Avisa a los workers de que hay mensajes nuevos (y los arranca si aún no existen). """
+        self.ensure_started()
+        self._wakeup.set()
+
+    def ensure_started(self):
+        """ Arranca los workers en este proceso (tras un fork los hilos del padre no existen). """
+        if self.workers <= 0 or self.app is None:
+            return
+        pid = os.getpid()
+        if self._pid == pid and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if self._pid != pid:
+                self._threads = []
+                self._pid = pid
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = Thread(target=self._run, name='outbox-{}'.format(len(self._threads)), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _listos(self, ahora):
+        """ Condición de los mensajes listos para enviar (también la de una reclamación caducada). """
+        return or_(and_(outbox_table.c.status == 'pending', outbox_table.c.next_attempt_at <= ahora),
+                   and_(outbox_table.c.status == 'sending',
+                        outbox_table.c.claimed_at < ahora - timedelta(seconds=self.claim_timeout)))
+
+    def claim(self, limite=None):
+        """
+        Reclama hasta `limite` mensajes listos para enviar (pendientes cuyo reintento ya toca, o en envío
+        cuya reclamación ha caducado) y devuelve sus filas.
+
+        Los ids se leen primero sin abrir una transacción de escritura, de modo que un sondeo con la cola
+        vacía no bloquea la bbdd (en SQLite, al resto de escrituras). El UPDATE repite la condición y
+        marca las filas con un token propio: si otro worker (u otro proceso) ha reclamado antes alguno de
+        esos mensajes, ya no la cumple y no se reclama dos veces.
+        """
+        ahora = datetime.utcnow()
+        with db.engine.connect() as connection:
+            ids = [fila[0] for fila in connection.execute(
+                select([outbox_table.c.id]).where(self._listos(ahora))
+                .order_by(outbox_table.c.next_attempt_at, outbox_table.c.id)
+                .limit(limite or self.batch_size))]
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        with db.engine.begin() as connection:
+            reclamados = connection.execute(outbox_table.update()
+                                            .where(and_(outbox_table.c.id.in_(ids), self._listos(ahora)))
+                                            .values(status='sending', claimed_by=token, claimed_at=ahora)).rowcount
+            if not reclamados:
+                return []
+            return connection.execute(select([outbox_table])
+                                      .where(and_(outbox_table.c.id.in_(ids), outbox_table.c.claimed_by == token))
+                                      .order_by(outbox_table.c.id)).fetchall()
+
+    def deliver(self, filas, connection):
+        """ Envía las filas reclamadas por la conexión SMTP `connection` y registra el resultado. """
+        enviados, fallidos = [], []
+        for fila in filas:
+            msg = Message(fila.subject, sender=fila.sender, recipients=fila.recipients.split(','),
+                          body=fila.body, html=fila.html)
+            try:
+                connection.send(msg)
+            except Exception as e:
+                logger.warning('Email %d no enviado (intento %d): %s', fila.id, fila.attempts + 1, e)
+                fallidos.append(self._fallo(fila, e))
+            else:
+                enviados.append({'b_id': fila.id, 'b_sent_at': datetime.utcnow()})
+
+        # Los mensajes ya se han enviado: si no se puede registrar el resultado se reintenta (p. ej. bbdd
+        # ocupada) antes de dejarlos reclamados, porque al caducar la reclamación se volverían a enviar
+        for intento in range(REGISTRO_INTENTOS):
+            try:
+                with db.engine.begin() as conn:
+                    if enviados:
+                        conn.execute(outbox_table.update().where(outbox_table.c.id == bindparam('b_id'))
+                                     .values(status='sent', sent_at=bindparam('b_sent_at'),
+                                             attempts=outbox_table.c.attempts + 1,
+                                             claimed_by=None, claimed_at=None, last_error=None), enviados)
+                    if fallidos:
+                        conn.execute(reintento, fallidos)
+                break
+            except db.DBAPIError:
+                if intento == REGISTRO_INTENTOS - 1:
+                    logger.error('No se ha podido registrar el envío de los emails %s',
+                                 [enviado['b_id'] for enviado in enviados])
+                    raise
+                time.sleep(2 ** intento)
+
+        with self._lock:
+            self.sent += len(enviados)
+            self.failed += sum(1 for fallo in fallidos if fallo['b_status'] == 'failed')
+            creados = {fila.id: fila.created_at for fila in filas}
+            for enviado in enviados:
+                self._latencies.append((enviado['b_sent_at'] - creados[enviado['b_id']]).total_seconds())
+        return len(enviados), len(fallidos)
+
+    def _fallo(self, fila, error):
+        intentos = fila.attempts + 1
+        espera = timedelta(seconds=self.backoff * 2 ** (intentos - 1))
+        return {'b_id': fila.id,
+                'b_status': 'failed' if intentos >= self.max_attempts else 'pending',
+                'b_attempts': intentos,
+                'b_next_attempt_at': datetime.utcnow() + espera,
+                'b_last_error': str(error)[:1000]}
+
+    def _release(self, filas, error):
+        """ Devuelve a la cola las filas reclamadas cuando no se ha podido abrir la conexión SMTP. """
+        fallidos = [self._fallo(fila, error) for fila in filas]
+        with db.engine.begin() as conn:
+            conn.execute(reintento, fallidos)
+        with self._lock:
+            self.failed += sum(1 for fallo in fallidos if fallo['b_status'] == 'failed')
+
+    def drain(self):
+        """
+        Envía en este hilo todo lo que esté listo, con una conexión SMTP por lote encadenado.
+        Devuelve (enviados, fallidos). Útil en tests, en la CLI y con OUTBOX_WORKERS = 0.
+        """
+        mail = self.app.extensions['mail']
+        total_enviados = total_fallidos = 0
+        filas = self.claim()
+        while filas:
+            try:
+                with mail.connect() as connection:
+                    # Una misma conexión para todos los lotes consecutivos
+                    while filas:
+                        # Las filas entregadas a deliver ya no se devuelven a la cola si falla algo
+                        # después: algunas pueden estar enviadas
+                        lote, filas = filas, None
+                        enviados, fallidos = self.deliver(lote, connection)
+                        total_enviados += enviados
+                        total_fallidos += fallidos
+                        filas = self.claim()
+            except Exception as e:
+                # Fallo al conectar (o al registrar un lote): reintentar más tarde lo reclamado que no ha
+                # llegado a deliver
+                logger.warning('Envío de emails interrumpido: %s', e)
+                if filas:
+                    self._release(filas, e)
+                    total_fallidos += len(filas)
+                break
+        return total_enviados, total_fallidos
+
+    def purge(self, dias=None, batch_size=500):
+        """
+        Borra por lotes los mensajes enviados hace más de `dias` días (OUTBOX_RETENTION_DAYS), para que
+        la tabla no crezca con cada email. Devuelve el número de mensajes borrados.
+        """
+        limite = datetime.utcnow() - timedelta(days=self.retention_days if dias is None else dias)
+        total = 0
+        while True:
+            with db.engine.connect() as connection:
+                ids = [fila[0] for fila in connection.execute(
+                    select([outbox_table.c.id])
+                    .where(and_(outbox_table.c.status == 'sent', outbox_table.c.sent_at < limite))
+                    .limit(batch_size))]
+            if not ids:
+                return total
+            with db.engine.begin() as connection:
+                total += connection.execute(outbox_table.delete().where(and_(
+                    outbox_table.c.id.in_(ids), outbox_table.c.status == 'sent'))).rowcount
+
+    def _run(self):
+        siguiente_purga = time.monotonic()
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.drain()
+                    if time.monotonic() >= siguiente_purga:
+                        siguiente_purga = time.monotonic() + self.purge_interval
+                        self.purge()
+            except Exception:
+                logger.exception('Error en el worker de la bandeja de salida')
+
+    def stats(self):
+        """ Profundidad de la cola, fallidos, enviados y latencia de entrega (segundos) de este proceso. """
+        with db.engine.connect() as connection:
+            por_estado = dict(connection.execute(select([outbox_table.c.status, func.count()])
+                                                 .group_by(outbox_table.c.status)).fetchall())
+            mas_antiguo = connection.execute(select([func.min(outbox_table.c.created_at)])
+                                             .where(outbox_table.c.status.in_(['pending', 'sending']))).scalar()
+        with self._lock:
+            latencias = list(self._latencies)
+            enviados, fallidos = self.sent, self.failed
+        return {'queue_depth': por_estado.get('pending', 0) + por_estado.get('sending', 0),
+                'pending': por_estado.get('pending', 0),
+                'sending': por_estado.get('sending', 0),
+                'sent': por_estado.get('sent', 0),
+                'failed': por_estado.get('failed', 0),
+                'oldest_pending_age': (datetime.utcnow() - mas_antiguo).total_seconds() if mas_antiguo else 0,
+                'process_sent': enviados,
+                'process_failed': fallidos,
+                'latency_avg': sum(latencias) / len(latencias) if latencias else 0,
+                'latency_max': max(latencias) if latencias else 0}
@@ -0,0 +1,60 @@
+"""
+Servidor de producción con gunicorn (pre-fork) y la aplicación precargada en el proceso maestro.
+
+    gunicorn -c gunicorn.conf.py wsgi:app      (o `flask serve`)
+
+Con preload_app el maestro importa el código y crea la aplicación una sola vez, y los workers la
+heredan en el fork compartiendo esa memoria (copy-on-write). Lo que no se puede heredar se resuelve con
+los hooks de gunicorn.conf.py:
+
+- before_fork (maestro): cierra las conexiones de la bbdd abiertas al crear la aplicación.
+- after_fork (worker): pools de conexiones nuevos, y arranca los workers de la bandeja de salida. El
+  pool de hashing de contraseñas y el hilo de last_seen ya se crean en el primer uso de cada proceso.
+- on_worker_exit (worker): escribe lo pendiente de last_seen y cierra el pool de hashing.
+
+Workers, hilos, reciclado por número de peticiones y tiempo de parada ordenada se configuran con las
+variables SERVER_* de config.py.
+"""
+
+import logging
+import multiprocessing
+from . import db
+from .extensions import last_seen_buffer, outbox, password_hasher
+
+logger = logging.getLogger(__name__)
+
+
+def workers(configurados=0):
+    """ Número de workers: el configurado o, si es 0, 2 por núcleo + 1. """
+    return configurados or multiprocessing.cpu_count() * 2 + 1
+
+
+def gunicorn_options(cfg):
+    """ Opciones de gunicorn a partir de la clase de configuración `cfg` (ver config.py). """
+    return {'bind': cfg.SERVER_BIND,
+            'workers': workers(cfg.SERVER_WORKERS),
+            'threads': cfg.SERVER_THREADS,
+            'worker_class': 'gthread' if cfg.SERVER_THREADS > 1 else 'sync',
+            'max_requests': cfg.SERVER_MAX_REQUESTS,
+            'max_requests_jitter': cfg.SERVER_MAX_REQUESTS_JITTER,
+            'timeout': cfg.SERVER_TIMEOUT,
+            'graceful_timeout': cfg.SERVER_GRACEFUL_TIMEOUT,
+            'keepalive': cfg.SERVER_KEEPALIVE,
+            'preload_app': True}
+
+
+def before_fork():
+    db.dispose_engines()
+
+
+def after_fork():
+    db.reset_after_fork()
+    outbox.ensure_started()
+
+
+def on_worker_exit():
+    try:
+        last_seen_buffer.flush()
+    except Exception:
+        logger.exception('No se ha podido escribir last_seen al terminar el worker')
+    password_hasher.shutdown()
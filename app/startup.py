@@ -0,0 +1,68 @@
+"""
+Medición del arranque en frío de un worker: tiempo de import por módulo y tiempo de create_app().
+
+Se ejecuta en un proceso Python nuevo con `-X importtime` para que ningún módulo esté ya cargado.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Script que se ejecuta en el proceso hijo. Imprime en stdout los tiempos (en segundos) en JSON;
+# -X importtime escribe el detalle de los imports en stderr.
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app({config_name!r})
+t2 = time.perf_counter()
+print(json.dumps({{'import': t1 - t0, 'factory': t2 - t1}}))
+"""
+
+
+def _parse_importtime(stderr):
+    """ Devuelve [(módulo, self_us, cumulative_us)] a partir de la salida de -X importtime. """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_startup(config_name, top=15):
+    """
+    Mide el arranque de la aplicación con la configuración `config_name`.
+
+    Devuelve un diccionario con el tiempo total de import, el de create_app(), y los `top` paquetes de
+    primer nivel y módulos más costosos (en milisegundos).
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE.format(config_name=config_name)],
+                            cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = _parse_importtime(result.stderr)
+
+    packages = {}
+    for name, self_us, _ in modules:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    import_ms = timings['import'] * 1000
+    factory_ms = timings['factory'] * 1000
+    return {
+        'config': config_name,
+        'import_ms': round(import_ms, 1),
+        'factory_ms': round(factory_ms, 1),
+        'total_ms': round(import_ms + factory_ms, 1),
+        'packages_ms': {package: round(us / 1000, 1)
+                        for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        'modules_ms': [{'module': name, 'self': round(self_us / 1000, 1), 'cumulative': round(cumulative_us / 1000, 1)}
+                       for name, self_us, cumulative_us in sorted(modules, key=lambda m: -m[1])[:top]],
+    }
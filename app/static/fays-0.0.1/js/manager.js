@@ -1,31 +1,197 @@
-< script >
-    var paginationHandler = function() {
-        // store pagination container so we only select it once
-        var $paginationContainer = $(".pagination-container"),
-            $pagination = $paginationContainer.find('.pagination ul');
-        // click event
-        $pagination.find("li a").on('click.pageChange', function(e) {
-            e.preventDefault();
-            // get parent li's data-page attribute and current page
-            var parentLiPage = $(this).parent('li').data("page"),
-                currentPage = parseInt($(".pagination-container div[data-page]:visible").data('page')),
-                numPages = $paginationContainer.find("div[data-page]").length;
-            // make sure they aren't clicking the current page
-            if (parseInt(parentLiPage) !== parseInt(currentPage)) {
-                // hide the current page
-                $paginationContainer.find("div[data-page]:visible").hide();
-                if (parentLiPage === '+') {
-                    // next page
-                    $paginationContainer.find("div[data-page=" + (currentPage + 1 > numPages ? numPages : currentPage + 1) + "]").show();
-                } else if (parentLiPage === '-') {
-                    // previous page
-                    $paginationContainer.find("div[data-page=" + (currentPage - 1 < 1 ? 1 : currentPage - 1) + "]").show();
-                } else {
-                    // specific page
-                    $paginationContainer.find("div[data-page=" + parseInt(parentLiPage) + "]").show();
-                }
+var paginationHandler = function() {
+    // store pagination container so we only select it once
+    var $paginationContainer = $(".pagination-container"),
+        $pagination = $paginationContainer.find('.pagination ul');
+    // click event
+    $pagination.find("li a").on('click.pageChange', function(e) {
+        e.preventDefault();
+        // get parent li's data-page attribute and current page
+        var parentLiPage = $(this).parent('li').data("page"),
+            currentPage = parseInt($(".pagination-container div[data-page]:visible").data('page')),
+            numPages = $paginationContainer.find("div[data-page]").length;
+        // make sure they aren't clicking the current page
+        if (parseInt(parentLiPage) !== parseInt(currentPage)) {
+            // hide the current page
+            $paginationContainer.find("div[data-page]:visible").hide();
+            if (parentLiPage === '+') {
+                // next page
+                $paginationContainer.find("div[data-page=" + (currentPage + 1 > numPages ? numPages : currentPage + 1) + "]").show();
+            } else if (parentLiPage === '-') {
+                // previous page
+                $paginationContainer.find("div[data-page=" + (currentPage - 1 < 1 ? 1 : currentPage - 1) + "]").show();
+            } else {
+                // specific page
+                $paginationContainer.find("div[data-page=" + parseInt(parentLiPage) + "]").show();
+            }
+        }
+    });
+};
+
+// Versión de los datos del usuario que muestra la página y versiones de los cambios hechos desde ella
+var agendaVersion = parseInt($(".agenda").data("version")) || 0,
+    versionesPropias = {};
+
+// Petición de la que el servidor devuelve solo la tarjeta afectada (ver _fragmento() en views.py)
+var peticionFragmento = function(url, opciones) {
+    opciones = $.extend({credentials: 'same-origin'}, opciones);
+    opciones.headers = $.extend({'X-Requested-With': 'XMLHttpRequest'}, opciones.headers);
+    return fetch(url, opciones).then(function(response) {
+        var version = parseInt(response.headers.get('X-Data-Version'));
+        if (version) {
+            versionesPropias[version] = true;
+            agendaVersion = Math.max(agendaVersion, version);
+        }
+        return response;
+    });
+};
+
+var tarjeta = function(id) {
+    return $(".tarea-card[data-id=" + id + "]").closest(".col-4");
+};
+
+var sustituirTarjeta = function(id, html) {
+    tarjeta(id).replaceWith(html);
+};
+
+var recargarTarjeta = function(id) {
+    return peticionFragmento('/manager_app/agenda/update/id=' + id).then(function(response) {
+        if (response.status === 404) {
+            tarjeta(id).remove();
+        } else if (response.ok) {
+            response.text().then(function(html) { sustituirTarjeta(id, html); });
+        }
+    });
+};
+
+// Agenda: Update y Delete de cada tarjeta sin recargar la página
+var agendaCardHandler = function() {
+    var $tareas = $(".agenda .tareas");
+    if (!$tareas.length) {
+        return;
+    }
+
+    // Botón con el que se envía el formulario (Delete usa formaction)
+    $tareas.on('click', '.tarea-card button', function() {
+        $(this).closest("form").data("boton", this);
+    });
+
+    $tareas.on('submit', '.tarea-card form', function(e) {
+        e.preventDefault();
+        var form = this,
+            boton = $(form).data("boton"),
+            url = (boton && boton.getAttribute("formaction")) || form.getAttribute("action"),
+            id = $(form).closest(".tarea-card").data("id");
+
+        peticionFragmento(url, {method: 'POST', body: new FormData(form)}).then(function(response) {
+            if (response.status === 204 || response.status === 404) {
+                tarjeta(id).remove();
+            } else if (response.ok) {
+                response.text().then(function(html) { sustituirTarjeta(id, html); });
+            } else {
+                form.submit();
             }
         });
+    });
+};
+
+// Agenda: marcar las tarjetas modificadas y guardarlas todas en una sola petición a /agenda/batch
+var agendaBatchHandler = function() {
+    var $guardar = $("#guardar-agenda");
+    if (!$guardar.length) {
+        return;
+    }
+
+    $(".agenda .tareas").on('input change', '.tarea-card input', function() {
+        $(this).closest(".tarea-card").addClass("modificada");
+    });
+
+    $guardar.on('click', function() {
+        var updates = [];
+        $(".tarea-card.modificada").each(function() {
+            var $card = $(this);
+            updates.push({
+                id: parseInt($card.data("id")),
+                tiempo_empleado: parseFloat($card.find("input[name=tiempo_empleado]").val()) || 0,
+                finalizada: $card.find("input[name=finalizada]").is(":checked")
+            });
+        });
+        if (!updates.length) {
+            return;
+        }
+
+        peticionFragmento($guardar.data("batch-url"), {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({updates: updates})
+        }).then(function(response) {
+            response.json().then(function(data) {
+                if (!response.ok) {
+                    alert(data.error);
+                    return;
+                }
+                if (data.version) {
+                    versionesPropias[data.version] = true;
+                    agendaVersion = Math.max(agendaVersion, data.version);
+                }
+                // Volver a pintar solo las tarjetas guardadas
+                $.each(updates, function(_, update) { recargarTarjeta(update.id); });
+            });
+        });
+    });
+};
+
+// Agenda: cambios hechos desde otras pestañas (Server-Sent Events, ver app/events.py)
+var agendaEventsHandler = function() {
+    var url = $(".agenda").data("events-url");
+    if (!url || !window.EventSource) {
+        return;
+    }
+
+    new EventSource(url).onmessage = function(e) {
+        var evento = JSON.parse(e.data);
+        if (evento.version && versionesPropias[evento.version]) {
+            return;
+        }
+        if (evento.accion === 'delete') {
+            tarjeta(evento.id).remove();
+        } else if (evento.accion === 'update') {
+            if (tarjeta(evento.id).length) {
+                recargarTarjeta(evento.id);
+            }
+        } else if (!evento.version || evento.version > agendaVersion) {
+            // Tareas nuevas o cambios de otro proceso: la página no sabe dónde van
+            $("#agenda-cambios").show();
+        }
+        agendaVersion = Math.max(agendaVersion, evento.version || 0);
     };
-$(document).ready(paginationHandler); <
-/script>
\ No newline at end of file
+};
+
+// Notebook: crear la tarea sin recargar y mostrar su tarjeta debajo del formulario
+var notebookHandler = function() {
+    var $form = $("form.nueva-tarea");
+    if (!$form.length) {
+        return;
+    }
+
+    $form.on('submit', function(e) {
+        e.preventDefault();
+        peticionFragmento($form.attr("action"), {method: 'POST', body: new FormData(this)}).then(function(response) {
+            if (response.status === 201) {
+                response.text().then(function(html) { $(".tareas-nuevas").prepend(html); });
+                $form.find("input[name=tarea], input[name=duracion_total]").val('');
+            } else if (response.status === 400) {
+                response.json().then(function(data) {
+                    alert($.map(data.errors, function(mensajes, campo) {
+                        return campo + ': ' + mensajes.join(', ');
+                    }).join('\n'));
+                });
+            }
+        });
+    });
+};
+
+$(document).ready(paginationHandler);
+$(document).ready(agendaCardHandler);
+$(document).ready(agendaBatchHandler);
+$(document).ready(agendaEventsHandler);
+$(document).ready(notebookHandler);
@@ -0,0 +1,157 @@
+"""
+Telemetría de rendimiento por petición.
+
+Para cada petición se mide el tiempo total y, con los eventos de SQLAlchemy de todos los engines
+(también el de lectura y los hilos de fondo), el número de sentencias SQL y su tiempo. Los valores se
+acumulan por endpoint en histogramas que /metrics expone en formato de texto de Prometheus. Las
+peticiones de más de SLOW_REQUEST_MS y las sentencias de más de SLOW_QUERY_MS se escriben en el log
+'app.slow'.
+
+La medición de SQL se activa con SQLALCHEMY_RECORD_QUERIES.
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from threading import Lock
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_log = logging.getLogger('app.slow')
+
+# Límites superiores de los buckets (segundos y número de sentencias)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_SENTENCIAS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _labels(nombres, valores):
+    if not nombres:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(nombre, str(valor).replace('\\', '\\\\').replace('"', '\\"'))
+                          for nombre, valor in zip(nombres, valores)) + '}'
+
+
+class Histogram(object):
+    """ Histograma acumulado de Prometheus con una serie por combinación de etiquetas. """
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}  # valores de las etiquetas -> [cuentas por bucket, suma, total]
+        self._lock = Lock()
+
+    def observe(self, valor, *labels):
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(labels)
+            if serie is None:
+                serie = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exposition(self):
+        lineas = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            series = sorted((labels, (list(cuentas), suma, total))
+                            for labels, (cuentas, suma, total) in self._series.items())
+        for labels, (cuentas, suma, total) in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets + ('+Inf',), cuentas):
+                acumulado += cuenta
+                etiquetas = _labels(self.labels + ('le',), labels + (limite,))
+                lineas.append('{}_bucket{} {}'.format(self.name, etiquetas, acumulado))
+            etiquetas = _labels(self.labels, labels)
+            lineas.append('{}_sum{} {}'.format(self.name, etiquetas, suma))
+            lineas.append('{}_count{} {}'.format(self.name, etiquetas, total))
+        return '\n'.join(lineas)
+
+
+def gauge(name, help, valores, labels=()):
+    """ Exposición de una métrica gauge: `valores` es {tupla de valores de etiquetas: valor}. """
+    lineas = ['# HELP {} {}'.format(name, help), '# TYPE {} gauge'.format(name)]
+    for valores_labels, valor in sorted(valores.items()):
+        lineas.append('{}{} {}'.format(name, _labels(labels, valores_labels), valor))
+    return '\n'.join(lineas)
+
+
+class Telemetry(object):
+
+    def __init__(self, slow_request_ms=500, slow_query_ms=100):
+        self.slow_request_ms = slow_request_ms
+        self.slow_query_ms = slow_query_ms
+        self.record_queries = False
+        self.request_duration = Histogram('fays_request_duration_seconds', 'Tiempo total de la petición.',
+                                          BUCKETS_SEGUNDOS, ('endpoint', 'method'))
+        self.request_queries = Histogram('fays_request_sql_queries', 'Sentencias SQL por petición.',
+                                         BUCKETS_SENTENCIAS, ('endpoint', 'method'))
+        self.request_sql = Histogram('fays_request_sql_seconds', 'Tiempo de SQL por petición.',
+                                     BUCKETS_SEGUNDOS, ('endpoint', 'method'))
+        self.query_duration = Histogram('fays_sql_query_duration_seconds', 'Tiempo de cada sentencia SQL.',
+                                        BUCKETS_SEGUNDOS)
+        self._listening = False
+
+    def init_app(self, app):
+        self.slow_request_ms = app.config.get('SLOW_REQUEST_MS', self.slow_request_ms)
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        self.record_queries = app.config.get('SQLALCHEMY_RECORD_QUERIES', False)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        # Eventos de la clase Engine: valen para todos los engines, también los creados después
+        if self.record_queries and not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+    def _before_request(self):
+        g._telemetry = [time.perf_counter(), 0, 0.0]  # inicio, sentencias, segundos de SQL
+
+    def _after_request(self, response):
+        medida = g.pop('_telemetry', None)
+        if medida is None:
+            return response
+        inicio, sentencias, sql = medida
+        duracion = time.perf_counter() - inicio
+        endpoint = request.endpoint or 'sin_endpoint'
+
+        self.request_duration.observe(duracion, endpoint, request.method)
+        if self.record_queries:
+            self.request_queries.observe(sentencias, endpoint, request.method)
+            self.request_sql.observe(sql, endpoint, request.method)
+
+        if duracion * 1000 >= self.slow_request_ms:
+            slow_log.warning('Petición lenta: %s %s %.1f ms (%d sentencias SQL, %.1f ms de SQL) -> %s',
+                             request.method, request.full_path, duracion * 1000, sentencias, sql * 1000,
+                             response.status_code)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_telemetry_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get('_telemetry_start')
+        if not inicios:
+            return
+        duracion = time.perf_counter() - inicios.pop()
+        self.query_duration.observe(duracion)
+
+        if has_request_context():
+            medida = g.get('_telemetry')
+            if medida is not None:
+                medida[1] += 1
+                medida[2] += duracion
+
+        if duracion * 1000 >= self.slow_query_ms:
+            slow_log.warning('Sentencia SQL lenta (%.1f ms): %s', duracion * 1000, ' '.join(statement.split()))
+
+    def exposition(self):
+        """ Histogramas en formato de texto de Prometheus. """
+        metricas = [self.request_duration]
+        if self.record_queries:
+            metricas += [self.request_queries, self.request_sql, self.query_duration]
+        return '\n'.join(metrica.exposition() for metrica in metricas)
@@ -0,0 +1,216 @@
+"""
+Exportación e importación de tareas (tabla manager) en CSV o JSON Lines.
+
+Las dos operaciones trabajan en memoria constante: la exportación lee las filas con un cursor de
+servidor (stream_results) de `batch_size` en `batch_size`, y la importación lee el fichero fila a fila y
+las inserta por lotes de `batch_size`, cada lote con un executemany en su propia transacción. Un lote
+importado queda guardado aunque falle uno posterior.
+
+Columnas: id, usuario, tarea, tipo, tiempo_empleado, duracion_total, finalizada, fecha_inicio y
+fecha_final (fechas en ISO). Al importar el id se ignora (las tareas reciben ids nuevos) y el resumen
+de task_summary lo actualizan los triggers (en otros motores, `flask rebuild-task-summary`).
+"""
+
+import csv
+import json
+import math
+from datetime import datetime
+from sqlalchemy import table, column, select, Boolean, Date, Float, Integer, String
+from . import db
+from .maintenance import parse_fecha
+
+COLUMNAS = ('id', 'usuario', 'tarea', 'tipo', 'tiempo_empleado', 'duracion_total', 'finalizada',
+            'fecha_inicio', 'fecha_final')
+
+FORMATOS = ('csv', 'jsonl')
+
+LONGITUD_TAREA = 20  # manager.tarea es String(20)
+
+manager = table('manager', column('id', Integer), column('usuario', Integer), column('tarea', String(LONGITUD_TAREA)),
+                column('tipo', String), column('tiempo_empleado', Float), column('duracion_total', Float),
+                column('finalizada', Boolean), column('fecha_inicio', Date), column('fecha_final', Date))
+users = table('users', column('id'), column('data_version'), column('data_updated'))
+
+VERDADERO = ('1', 'true', 't', 'y', 'yes', 'si', 'sí')
+FALSO = ('0', 'false', 'f', 'n', 'no', '')
+
+
+def formato_de(nombre, formato=None):
+    """ Formato indicado o, si no se indica, el de la extensión del fichero (csv por defecto). """
+    if formato:
+        return formato
+    return 'jsonl' if isinstance(nombre, str) and nombre.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _serializar(fila, formato):
+    datos = dict(zip(COLUMNAS, fila))
+    for fecha in ('fecha_inicio', 'fecha_final'):
+        if datos[fecha] is not None:
+            datos[fecha] = datos[fecha].isoformat()
+    if datos['finalizada'] is not None:
+        datos['finalizada'] = bool(datos['finalizada'])
+        if formato == 'csv':
+            datos['finalizada'] = int(datos['finalizada'])
+    return datos
+
+
+def export_tasks(f, formato='csv', usuario=None, batch_size=1000):
+    """
+    Escribe en el fichero de texto `f` las tareas (o solo las del `usuario`) en orden de id.
+    Devuelve el número de tareas exportadas.
+    """
+    consulta = select([manager.c[nombre] for nombre in COLUMNAS]).order_by(manager.c.id)
+    if usuario is not None:
+        consulta = consulta.where(manager.c.usuario == usuario)
+
+    if formato == 'csv':
+        writer = csv.DictWriter(f, COLUMNAS, lineterminator='\n')
+        writer.writeheader()
+        escribir = writer.writerow
+    else:
+        def escribir(datos):
+            f.write(json.dumps(datos, ensure_ascii=False) + '\n')
+
+    total = 0
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(consulta)
+        while True:
+            filas = result.fetchmany(batch_size)
+            if not filas:
+                break
+            for fila in filas:
+                escribir(_serializar(fila, formato))
+            total += len(filas)
+    return total
+
+
+def _leer(f, formato):
+    """ Genera (número de línea, diccionario) de cada tarea del fichero, sin cargarlo entero. """
+    if formato == 'csv':
+        reader = csv.DictReader(f)
+        for datos in reader:
+            yield reader.line_num, datos
+    else:
+        for linea, texto in enumerate(f, 1):
+            if texto.strip():
+                try:
+                    datos = json.loads(texto)
+                except ValueError as e:
+                    datos = e
+                yield linea, datos
+
+
+def _numero(valor, nombre, obligatorio=False):
+    if valor is None or valor == '':
+        if obligatorio:
+            raise ValueError('falta {}'.format(nombre))
+        return None
+    try:
+        if isinstance(valor, bool):
+            raise TypeError
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError('{} no es un número: {!r}'.format(nombre, valor))
+    if not math.isfinite(numero):
+        raise ValueError('{} no es un número finito: {!r}'.format(nombre, valor))
+    return numero
+
+
+def _booleano(valor):
+    if valor is None or isinstance(valor, bool):
+        return bool(valor)
+    texto = str(valor).strip().lower()
+    if texto in VERDADERO:
+        return True
+    if texto in FALSO:
+        return False
+    raise ValueError('finalizada no es un booleano: {!r}'.format(valor))
+
+
+def validar(datos, tipos, usuario=None):
+    """ Convierte una tarea leída del fichero en los valores de la fila; ValueError si no es válida. """
+    if isinstance(datos, Exception):
+        raise ValueError('JSON no válido: {}'.format(datos))
+    if not isinstance(datos, dict):
+        raise ValueError('se esperaba un objeto JSON')
+
+    tarea = datos.get('tarea') or ''
+    if not isinstance(tarea, str) or not tarea.strip():
+        raise ValueError('falta tarea')
+    tarea = tarea.strip()
+    if len(tarea) > LONGITUD_TAREA:
+        raise ValueError('tarea de más de {} caracteres'.format(LONGITUD_TAREA))
+    tipo = datos.get('tipo')
+    if tipo not in tipos:
+        raise ValueError('tipo de tarea desconocido: {!r}'.format(tipo))
+
+    if usuario is None:
+        try:
+            usuario = int(datos.get('usuario'))
+        except (TypeError, ValueError):
+            raise ValueError('usuario no válido: {!r}'.format(datos.get('usuario')))
+
+    fechas = {}
+    for nombre in ('fecha_inicio', 'fecha_final'):
+        valor = datos.get(nombre) or None
+        fechas[nombre] = parse_fecha(valor)
+        if valor is not None and fechas[nombre] is None:
+            raise ValueError('{} no es una fecha: {!r}'.format(nombre, valor))
+    if fechas['fecha_inicio'] and fechas['fecha_final'] and fechas['fecha_inicio'] > fechas['fecha_final']:
+        raise ValueError('fecha_inicio posterior a fecha_final')
+
+    return {'usuario': usuario,
+            'tarea': tarea,
+            'tipo': tipo,
+            'tiempo_empleado': _numero(datos.get('tiempo_empleado'), 'tiempo_empleado') or 0,
+            'duracion_total': _numero(datos.get('duracion_total'), 'duracion_total', obligatorio=True),
+            'finalizada': _booleano(datos.get('finalizada')),
+            'fecha_inicio': fechas['fecha_inicio'],
+            'fecha_final': fechas['fecha_final']}
+
+
+def _guardar(lote):
+    """ Inserta un lote [(línea, fila)] en una transacción. Devuelve (insertadas, errores). """
+    errores = []
+    with db.engine.begin() as connection:
+        ids = {fila['usuario'] for _, fila in lote}
+        existentes = {id for id, in connection.execute(select([users.c.id]).where(users.c.id.in_(ids)))}
+        filas = []
+        for linea, fila in lote:
+            if fila['usuario'] in existentes:
+                filas.append(fila)
+            else:
+                errores.append((linea, 'el usuario {} no existe'.format(fila['usuario'])))
+
+        if filas:
+            connection.execute(manager.insert(), filas)
+            # Las páginas en caché de los usuarios afectados dejan de ser válidas
+            connection.execute(users.update().where(users.c.id.in_({fila['usuario'] for fila in filas}))
+                               .values(data_version=users.c.data_version + 1, data_updated=datetime.utcnow()))
+    return len(filas), errores
+
+
+def import_tasks(f, formato='csv', batch_size=1000, usuario=None):
+    """
+    Importa las tareas del fichero de texto `f`, asignándolas al `usuario` indicado o al de cada fila.
+    Las filas no válidas (o de usuarios que no existen) se descartan.
+
+    Es un generador que devuelve (última línea, insertadas, [(línea, error)]) tras cada lote.
+    """
+    from .models import ClasificadorTareasABC
+
+    tipos = ClasificadorTareasABC.tipos()
+    lote, errores, linea = [], [], 0
+    for linea, datos in _leer(f, formato):
+        try:
+            lote.append((linea, validar(datos, tipos, usuario)))
+        except ValueError as e:
+            errores.append((linea, str(e)))
+        if len(lote) + len(errores) >= batch_size:
+            insertadas, descartadas = _guardar(lote) if lote else (0, [])
+            yield linea, insertadas, errores + descartadas
+            lote, errores = [], []
+
+    if lote or errores:
+        insertadas, descartadas = _guardar(lote) if lote else (0, [])
+        yield linea, insertadas, errores + descartadas
@@ -23,6 +23,138 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_RECORD_QUERIES = True
 
+    # Log de peticiones y sentencias SQL lentas (milisegundos)
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 100))
+
+    # Bbdd opcional (réplica) para las consultas de solo lectura. Las escrituras van siempre a
+    # SQLALCHEMY_DATABASE_URI.
+    SQLALCHEMY_READ_DATABASE_URI = None
+
+    # Presupuesto de arranque en frío de un worker (import + create_app), en milisegundos
+    STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS', 1500))
+
+    # Caché de identidad de usuarios por proceso (entradas y segundos de validez)
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 4096))
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+
+    # Cache-Control de los ficheros estáticos con huella de contenido (/assets/...): un año
+    ASSETS_MAX_AGE = 31536000
+    # Recompilar los paquetes estáticos en cada create_app (para ver los cambios de las fuentes en
+    # desarrollo). Si no, solo se compilan si falta el manifest o está incompleto.
+    ASSETS_AUTO_BUILD = bool(int(os.environ.get('ASSETS_AUTO_BUILD', 0)))
+
+    # Avatares (identicons) generados localmente: directorio y tamaño máximo de la caché en disco,
+    # tamaños permitidos en píxeles y Cache-Control de las respuestas
+    AVATAR_CACHE_DIR = os.environ.get('AVATAR_CACHE_DIR')
+    AVATAR_CACHE_MAX_BYTES = int(os.environ.get('AVATAR_CACHE_MAX_BYTES', 20 * 1024 * 1024))
+    AVATAR_MIN_SIZE = 8
+    AVATAR_MAX_SIZE = 512
+    AVATAR_MAX_AGE = 31536000
+
+    # Caché de páginas renderizadas (perfil y agenda): entradas, segundos de validez y espera máxima
+    # de una petición a que otra termine de renderizar la misma página
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 256))
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+    PAGE_CACHE_WAIT = 10
+
+    # Escrituras agrupadas de users.last_seen: como mucho una por usuario cada LAST_SEEN_RESOLUTION
+    # segundos, en un UPDATE por lotes cada LAST_SEEN_FLUSH_INTERVAL segundos o LAST_SEEN_FLUSH_SIZE usuarios
+    LAST_SEEN_RESOLUTION = int(os.environ.get('LAST_SEEN_RESOLUTION', 60))
+    LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL', 30))
+    LAST_SEEN_FLUSH_SIZE = int(os.environ.get('LAST_SEEN_FLUSH_SIZE', 500))
+
+    # Hashing de contraseñas: coste (método werkzeug con iteraciones) y pool de procesos. Si cambian los
+    # parámetros, el hash se regenera en el siguiente login del usuario.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_MAX = int(os.environ.get('PASSWORD_HASH_QUEUE_MAX', 32))
+    PASSWORD_HASH_TIMEOUT = 30
+    PASSWORD_HASH_RETRY_AFTER = 2
+
+    # Bandeja de salida de emails: workers de envío por proceso, mensajes por lote (misma conexión SMTP),
+    # reintentos con espera exponencial desde OUTBOX_BACKOFF segundos y reclamaciones caducadas
+    OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', 2))
+    OUTBOX_BATCH_SIZE = 20
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_BACKOFF = 30
+    OUTBOX_POLL_INTERVAL = 5
+    OUTBOX_CLAIM_TIMEOUT = 300
+    OUTBOX_RETENTION_DAYS = int(os.environ.get('OUTBOX_RETENTION_DAYS', 7))  # Días que se guardan los enviados
+    OUTBOX_PURGE_INTERVAL = 3600
+
+    # Paginación de la agenda (tareas por página y máximo permitido con ?limit=)
+    AGENDA_PAGE_SIZE = 30
+    AGENDA_PAGE_SIZE_MAX = 100
+
+    # Aviso de cambios a las otras pestañas de la agenda (Server-Sent Events). Cada pestaña abierta ocupa
+    # un hilo del worker: activarlo solo con hilos suficientes (SERVER_THREADS)
+    AGENDA_EVENTS = os.environ.get('AGENDA_EVENTS', '0') == '1'
+    AGENDA_EVENTS_TIMEOUT = 55
+    AGENDA_EVENTS_POLL_INTERVAL = 5
+
+    # Filas leídas de la bbdd en cada lote de las descargas /agenda.csv y /agenda.ics
+    AGENDA_EXPORT_BATCH_SIZE = 500
+
+    # Máximo de actualizaciones + eliminaciones por petición a /manager_app/agenda/batch
+    AGENDA_BATCH_MAX = 500
+
+    # Archivado de tareas (`flask archive-tasks`): finalizadas con fecha final de hace más de
+    # ARCHIVE_AFTER_DAYS días, por lotes de ARCHIVE_BATCH_SIZE tareas
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+    ARCHIVE_BATCH_SIZE = 500
+
+    # API JSON de tareas: tamaño de página y máximo de tareas por alta masiva. Cada fila del INSERT
+    # multi-fila usa 8 parámetros (SQLite admite 999 en versiones antiguas).
+    API_PAGE_SIZE = 100
+    API_PAGE_SIZE_MAX = 1000
+    API_BULK_MAX = 100
+    # Resultados por defecto de /manager_app/api/search
+    API_SEARCH_SIZE = 20
+
+    # Control de admisión de los endpoints caros (@limited, ver app/admission.py). Por clase: peticiones
+    # simultáneas por worker (por debajo de SERVER_THREADS, para dejar hilos a las páginas baratas) y
+    # token bucket por IP y por usuario (peticiones por segundo y ráfaga).
+    ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', '1') == '1'
+    ADMISSION_LIMITS = {
+        'auth': {'concurrency': 2, 'rate': 0.2, 'burst': 10},   # Login, registro y contraseñas (hashing, email)
+        'write': {'concurrency': 3, 'rate': 5, 'burst': 30},    # Altas, cambios y bajas de tareas
+        'export': {'concurrency': 2, 'rate': 0.1, 'burst': 5},  # Descargas de la agenda
+    }
+    ADMISSION_RETRY_AFTER = 1  # Segundos de Retry-After del 503 por exceso de peticiones simultáneas
+    ADMISSION_BUCKETS_MAX = 10000
+
+    # Proxies inversos de confianza delante de la aplicación (wsgi.py): la IP del cliente se toma de las
+    # últimas PROXY_FIX_X_FOR entradas de X-Forwarded-For. 0: sin proxy (la IP es la de la conexión)
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    PROXY_FIX_X_PROTO = int(os.environ.get('PROXY_FIX_X_PROTO', 0))
+
+    # Pool de conexiones de la bbdd
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('SQLALCHEMY_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_RECYCLE = int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', 1800))
+    SQLALCHEMY_POOL_PRE_PING = True
+
+    # Servidor de producción (gunicorn.conf.py y `flask serve`). SERVER_WORKERS = 0: 2 por núcleo + 1.
+    # Cada worker recibe hasta SERVER_THREADS peticiones simultáneas: el pool de conexiones
+    # (SQLALCHEMY_POOL_SIZE + SQLALCHEMY_MAX_OVERFLOW) debe ser al menos igual.
+    SERVER_BIND = os.environ.get('SERVER_BIND', '127.0.0.1:8000')
+    SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 0))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 5000))  # Reciclar el worker tras N peticiones
+    SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 500))
+    SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', 30))
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))  # Parada ordenada
+    SERVER_KEEPALIVE = int(os.environ.get('SERVER_KEEPALIVE', 5))
+
+    # PRAGMA aplicados a cada conexión SQLite nueva
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'synchronous': 'NORMAL',
+    }
+
     @staticmethod
     def init_app(app):
         pass
@@ -30,17 +162,28 @@ class Config:
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
-        'sqlite:///' + os.path.join(basedir, 'data-dev.sqlite')
+        'sqlite:///' + os.path.join(basedir, 'app', 'databases', 'fays-web-dev.db')
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('DEV_READ_DATABASE_URL')
+    ASSETS_AUTO_BUILD = bool(int(os.environ.get('ASSETS_AUTO_BUILD', 1)))
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
         'sqlite://'
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('TEST_READ_DATABASE_URL')
     WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_WORKERS = 0
+    OUTBOX_WORKERS = 0
+    ADMISSION_CONTROL = False
 
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'data.sqlite')
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('READ_DATABASE_URL')
+    # El servidor escucha en 127.0.0.1 (SERVER_BIND): se sirve detrás de un proxy inverso
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 1))
+    PROXY_FIX_X_PROTO = int(os.environ.get('PROXY_FIX_X_PROTO', 1))
 
     @classmethod
     def init_app(cls, app):
@@ -0,0 +1,28 @@
+"""
+Configuración de gunicorn (ver app/server.py). Los valores salen de las variables SERVER_* de la
+configuración seleccionada con FLASK_CONFIG.
+"""
+
+import os
+import config as _config
+from app.server import gunicorn_options
+
+# gunicorn interpreta como opción cada nombre global del fichero: solo se definen opciones y hooks
+globals().update(gunicorn_options(_config.config[os.getenv('FLASK_CONFIG') or 'production']))
+del os, _config, gunicorn_options
+
+
+def pre_fork(server, worker):
+    from app.server import before_fork
+    before_fork()
+
+
+def post_fork(server, worker):
+    from app.server import after_fork
+    after_fork()
+    server.log.info('Worker %s listo', worker.pid)
+
+
+def worker_exit(server, worker):
+    from app.server import on_worker_exit
+    on_worker_exit()
@@ -0,0 +1,76 @@
+"""esquema inicial
+
+Revision ID: 6a1f0c3d2b91
+Revises:
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1f0c3d2b91'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('roles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=True),
+    sa.Column('default', sa.Boolean(), nullable=True),
+    sa.Column('permissions', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_roles_default'), 'roles', ['default'], unique=False)
+    op.create_table('clasificador_tareas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=10), nullable=True),
+    sa.Column('descripcion', sa.Text(), nullable=False),
+    sa.Column('ponderacion', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=64), nullable=True),
+    sa.Column('username', sa.String(length=64), nullable=True),
+    sa.Column('role_id', sa.Integer(), nullable=True),
+    sa.Column('password_hash', sa.String(length=128), nullable=True),
+    sa.Column('confirmed', sa.Boolean(), nullable=True),
+    sa.Column('name', sa.String(length=64), nullable=True),
+    sa.Column('about_me', sa.Text(), nullable=True),
+    sa.Column('member_since', sa.DateTime(), nullable=True),
+    sa.Column('last_seen', sa.DateTime(), nullable=True),
+    sa.Column('avatar_hash', sa.String(length=32), nullable=True),
+    sa.ForeignKeyConstraint(['role_id'], ['roles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_table('manager',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('usuario', sa.Integer(), nullable=True),
+    sa.Column('tarea', sa.String(length=20), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('tiempo_empleado', sa.Float(), nullable=True),
+    sa.Column('duracion_total', sa.Float(), nullable=True),
+    sa.Column('finalizada', sa.Boolean(), nullable=True),
+    sa.Column('fecha_inicio', sa.String(), nullable=True),
+    sa.Column('fecha_final', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['tipo'], ['clasificador_tareas.tipo'], ),
+    sa.ForeignKeyConstraint(['usuario'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('manager')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_table('clasificador_tareas')
+    op.drop_index(op.f('ix_roles_default'), table_name='roles')
+    op.drop_table('roles')
@@ -0,0 +1,72 @@
+"""resumen de tareas por usuario y tipo ABC
+
+Revision ID: a3d95e7c1f60
+Revises: f2a6c8d19b47
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d95e7c1f60'
+down_revision = 'f2a6c8d19b47'
+branch_labels = None
+depends_on = None
+
+
+def _sumar(fila, signo):
+    return """
+        INSERT OR IGNORE INTO task_summary (usuario, tipo, total, finalizadas, tiempo_empleado, duracion_total)
+            SELECT {f}.usuario, {f}.tipo, 0, 0, 0, 0 WHERE {f}.usuario IS NOT NULL;
+        UPDATE task_summary
+            SET total = total {s} 1,
+                finalizadas = finalizadas {s} (CASE WHEN {f}.finalizada THEN 1 ELSE 0 END),
+                tiempo_empleado = tiempo_empleado {s} COALESCE({f}.tiempo_empleado, 0),
+                duracion_total = duracion_total {s} COALESCE({f}.duracion_total, 0)
+            WHERE usuario = {f}.usuario AND tipo = {f}.tipo;
+        DELETE FROM task_summary WHERE usuario = {f}.usuario AND tipo = {f}.tipo AND total <= 0;""" \
+        .format(f=fila, s=signo)
+
+
+TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS task_summary_insert AFTER INSERT ON manager BEGIN{} END'
+    .format(_sumar('NEW', '+')),
+    'CREATE TRIGGER IF NOT EXISTS task_summary_delete AFTER DELETE ON manager BEGIN{} END'
+    .format(_sumar('OLD', '-')),
+    'CREATE TRIGGER IF NOT EXISTS task_summary_update '
+    'AFTER UPDATE OF usuario, tipo, finalizada, tiempo_empleado, duracion_total ON manager BEGIN{}{} END'
+    .format(_sumar('OLD', '-'), _sumar('NEW', '+')),
+)
+
+
+def upgrade():
+    op.create_table('task_summary',
+    sa.Column('usuario', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('finalizadas', sa.Integer(), nullable=False),
+    sa.Column('tiempo_empleado', sa.Float(), nullable=False),
+    sa.Column('duracion_total', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['usuario'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('usuario', 'tipo')
+    )
+
+    # Resumen de las tareas existentes
+    op.execute("""
+        INSERT INTO task_summary (usuario, tipo, total, finalizadas, tiempo_empleado, duracion_total)
+        SELECT usuario, tipo, COUNT(*), SUM(CASE WHEN finalizada THEN 1 ELSE 0 END),
+               COALESCE(SUM(tiempo_empleado), 0), COALESCE(SUM(duracion_total), 0)
+        FROM manager WHERE usuario IS NOT NULL GROUP BY usuario, tipo""")
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in TRIGGERS:
+            op.execute(trigger)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('task_summary_insert', 'task_summary_delete', 'task_summary_update'):
+            op.execute('DROP TRIGGER IF EXISTS {}'.format(trigger))
+    op.drop_table('task_summary')
@@ -0,0 +1,44 @@
+"""índice de búsqueda de texto de las tareas (SQLite FTS5)
+
+Revision ID: b58f1d3e9a27
+Revises: c6e0b4f2a813
+Create Date: 2026-10-18 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58f1d3e9a27'
+down_revision = 'c6e0b4f2a813'
+branch_labels = None
+depends_on = None
+
+DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5(tarea, content='manager', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 1', prefix='2 3')",
+    'CREATE TRIGGER IF NOT EXISTS task_search_insert AFTER INSERT ON manager BEGIN '
+    'INSERT INTO task_search (rowid, tarea) VALUES (NEW.id, NEW.tarea); END',
+    'CREATE TRIGGER IF NOT EXISTS task_search_delete AFTER DELETE ON manager BEGIN '
+    "INSERT INTO task_search (task_search, rowid, tarea) VALUES ('delete', OLD.id, OLD.tarea); END",
+    'CREATE TRIGGER IF NOT EXISTS task_search_update AFTER UPDATE OF tarea ON manager BEGIN '
+    "INSERT INTO task_search (task_search, rowid, tarea) VALUES ('delete', OLD.id, OLD.tarea); "
+    'INSERT INTO task_search (rowid, tarea) VALUES (NEW.id, NEW.tarea); END',
+)
+
+
+def upgrade():
+    # En otros motores la búsqueda usa LIKE sobre las tareas del usuario (ver Task.buscar)
+    if op.get_bind().dialect.name == 'sqlite':
+        for ddl in DDL:
+            op.execute(ddl)
+        # Índice de las tareas existentes
+        op.execute("INSERT INTO task_search (task_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('task_search_insert', 'task_search_delete', 'task_search_update'):
+            op.execute('DROP TRIGGER IF EXISTS {}'.format(trigger))
+        op.execute('DROP TABLE IF EXISTS task_search')
@@ -0,0 +1,30 @@
+"""indices compuestos de la agenda
+
+Revision ID: b7c2e4a9d013
+Revises: 6a1f0c3d2b91
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c2e4a9d013'
+down_revision = '6a1f0c3d2b91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_manager_usuario_fecha_final_id', 'manager', ['usuario', 'fecha_final', 'id'], unique=False)
+    op.create_index('ix_manager_usuario_finalizada_fecha_final_id', 'manager',
+                    ['usuario', 'finalizada', 'fecha_final', 'id'], unique=False)
+    op.create_index('ix_manager_usuario_tipo_fecha_final_id', 'manager',
+                    ['usuario', 'tipo', 'fecha_final', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_manager_usuario_tipo_fecha_final_id', table_name='manager')
+    op.drop_index('ix_manager_usuario_finalizada_fecha_final_id', table_name='manager')
+    op.drop_index('ix_manager_usuario_fecha_final_id', table_name='manager')
@@ -0,0 +1,32 @@
+"""nombre de los tipos del clasificador ABC
+
+Revision ID: c6e0b4f2a813
+Revises: a3d95e7c1f60
+Create Date: 2026-10-18 13:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e0b4f2a813'
+down_revision = 'a3d95e7c1f60'
+branch_labels = None
+depends_on = None
+
+NOMBRES = {'A': 'Muy Importante', 'B': 'Importante', 'C': 'Poco importantes'}
+
+
+def upgrade():
+    with op.batch_alter_table('clasificador_tareas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('nombre', sa.String(length=64), nullable=True))
+
+    clasificador = sa.table('clasificador_tareas', sa.column('tipo'), sa.column('nombre'))
+    for tipo, nombre in NOMBRES.items():
+        op.execute(clasificador.update().where(clasificador.c.tipo == tipo).values(nombre=nombre))
+
+
+def downgrade():
+    with op.batch_alter_table('clasificador_tareas', schema=None) as batch_op:
+        batch_op.drop_column('nombre')
@@ -0,0 +1,90 @@
+"""archivo de tareas finalizadas
+
+Revision ID: c81a4e6f2d35
+Revises: b58f1d3e9a27
+Create Date: 2026-10-18 17:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81a4e6f2d35'
+down_revision = 'b58f1d3e9a27'
+branch_labels = None
+depends_on = None
+
+
+def _sumar(fila, signo):
+    return """
+        INSERT OR IGNORE INTO task_summary (usuario, tipo, total, finalizadas, tiempo_empleado, duracion_total)
+            SELECT {f}.usuario, {f}.tipo, 0, 0, 0, 0 WHERE {f}.usuario IS NOT NULL;
+        UPDATE task_summary
+            SET total = total {s} 1,
+                finalizadas = finalizadas {s} (CASE WHEN {f}.finalizada THEN 1 ELSE 0 END),
+                tiempo_empleado = tiempo_empleado {s} COALESCE({f}.tiempo_empleado, 0),
+                duracion_total = duracion_total {s} COALESCE({f}.duracion_total, 0)
+            WHERE usuario = {f}.usuario AND tipo = {f}.tipo;
+        DELETE FROM task_summary WHERE usuario = {f}.usuario AND tipo = {f}.tipo AND total <= 0;""" \
+        .format(f=fila, s=signo)
+
+
+TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS task_archive_summary_insert AFTER INSERT ON manager_archive BEGIN{} END'
+    .format(_sumar('NEW', '+')),
+    'CREATE TRIGGER IF NOT EXISTS task_archive_summary_delete AFTER DELETE ON manager_archive BEGIN{} END'
+    .format(_sumar('OLD', '-')),
+)
+
+
+def upgrade():
+    op.create_table('manager_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('usuario', sa.Integer(), nullable=True),
+    sa.Column('tarea', sa.String(length=20), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False),
+    sa.Column('tiempo_empleado', sa.Float(), nullable=True),
+    sa.Column('duracion_total', sa.Float(), nullable=True),
+    sa.Column('finalizada', sa.Boolean(), nullable=True),
+    sa.Column('fecha_inicio', sa.Date(), nullable=True),
+    sa.Column('fecha_final', sa.Date(), nullable=True),
+    sa.Column('archivada', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['tipo'], ['clasificador_tareas.tipo'], ),
+    sa.ForeignKeyConstraint(['usuario'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_manager_archive_usuario_fecha_final_id', 'manager_archive',
+                    ['usuario', 'fecha_final', 'id'], unique=False)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in TRIGGERS:
+            op.execute(trigger)
+
+        # Los ids de manager no se deben reutilizar (las tareas archivadas conservan el suyo): SQLite solo
+        # lo garantiza con AUTOINCREMENT, y para añadirlo hay que reconstruir la tabla. Sus triggers se
+        # borran con ella y se vuelven a crear después.
+        triggers = [sql for sql, in op.get_bind().execute(
+            sa.text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'manager'"))]
+        with op.batch_alter_table('manager', recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}):
+            pass
+        for trigger in triggers:
+            op.execute(trigger)
+
+
+def downgrade():
+    # Las tareas archivadas vuelven a la tabla manager (en SQLite los triggers mantienen task_summary:
+    # suma al insertar en manager y resta al borrar del archivo)
+    op.execute("""
+        INSERT INTO manager (id, usuario, tarea, tipo, tiempo_empleado, duracion_total, finalizada,
+                             fecha_inicio, fecha_final)
+        SELECT id, usuario, tarea, tipo, tiempo_empleado, duracion_total, finalizada, fecha_inicio, fecha_final
+        FROM manager_archive""")
+    op.execute('DELETE FROM manager_archive')
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('task_archive_summary_insert', 'task_archive_summary_delete'):
+            op.execute('DROP TRIGGER IF EXISTS {}'.format(trigger))
+    op.drop_index('ix_manager_archive_usuario_fecha_final_id', table_name='manager_archive')
+    op.drop_table('manager_archive')
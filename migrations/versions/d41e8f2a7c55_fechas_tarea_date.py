@@ -0,0 +1,36 @@
+"""fechas de la tarea como Date
+
+Revision ID: d41e8f2a7c55
+Revises: b7c2e4a9d013
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41e8f2a7c55'
+down_revision = 'b7c2e4a9d013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En SQLite una columna Date se guarda como texto ISO (YYYY-MM-DD): no se reescribe la tabla.
+    # Los valores existentes se normalizan por lotes con `flask backfill-task-dates` (lo ejecuta deploy).
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+
+    op.alter_column('manager', 'fecha_inicio', type_=sa.Date(), existing_nullable=True,
+                    postgresql_using='fecha_inicio::date')
+    op.alter_column('manager', 'fecha_final', type_=sa.Date(), existing_nullable=True,
+                    postgresql_using='fecha_final::date')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+
+    op.alter_column('manager', 'fecha_final', type_=sa.String(), existing_nullable=True)
+    op.alter_column('manager', 'fecha_inicio', type_=sa.String(), existing_nullable=True)
@@ -0,0 +1,21 @@
+"""
+Punto de entrada WSGI de producción:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+La configuración se elige con FLASK_CONFIG (por defecto 'production').
+
+Detrás de un proxy inverso (nginx...) la IP del cliente es la del proxy: con PROXY_FIX_X_FOR > 0 se toma
+de X-Forwarded-For (y el esquema de X-Forwarded-Proto), confiando en ese número de proxies. La usan,
+entre otros, los límites por IP de @limited (app/admission.py).
+"""
+
+import os
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app import create_app
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'production')
+
+if app.config['PROXY_FIX_X_FOR']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                            x_proto=app.config['PROXY_FIX_X_PROTO'])